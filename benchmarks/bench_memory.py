@@ -0,0 +1,118 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import asyncio
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+
+SIZE = 50 * 1024 * 1024
+
+
+class _DiscardingHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 64 * 1024)))
+        self.send_response(200)
+        self.end_headers()
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def _generate(directory: Path) -> dict[str, Path]:
+    mspl = directory / "mspl.xml"
+    with open(mspl, "w") as output:
+        output.write('<?xml version="1.0"?>\n<ITResourceOrchestration>\n')
+        while output.tell() < SIZE:
+            output.write('  <ITResource id="resource"><configuration>value</configuration></ITResource>\n' * 1000)
+        output.write("</ITResourceOrchestration>\n")
+
+    manifests = directory / "manifests.yaml"
+    with open(manifests, "w") as output:
+        idx = 0
+        while output.tell() < SIZE:
+            output.write(f"apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: config-{idx}\ndata:\n  key: {'x' * 512}\n---\n")
+            idx += 1
+
+    return {"mspl": mspl, "manifests": manifests}
+
+
+def _child(mode: str, filename: str) -> None:
+    import kubectl_fluidos
+    from kubectl_fluidos.mspl import MSPLProcessor
+    from kubectl_fluidos.mspl import MSPLProcessorConfiguration
+    from kubectl_fluidos.pipeline import fluidos_kubectl_extension_async
+
+    server = HTTPServer(("127.0.0.1", 0), _DiscardingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/meservice"
+
+    if mode == "before":
+        # sequence of the text based implementation: decode, parse, and re-encode on submission
+        with open(filename) as input_file:
+            data = input_file.read()
+        try:
+            input_format, _ = kubectl_fluidos._check_input_format(data)
+            if input_format == kubectl_fluidos.InputFormat.MSPL:
+                MSPLProcessor(MSPLProcessorConfiguration(url=url))(data)
+        except ValueError:
+            pass
+    else:
+        asyncio.run(fluidos_kubectl_extension_async(
+            ["kubectl-fluidos", "-f", filename],
+            StringIO(),
+            on_apply=lambda args, stdin: 0,
+            mspl_processor=lambda: MSPLProcessor(MSPLProcessorConfiguration(url=url))
+        ))
+
+    server.shutdown()
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _peak_rss(mode: str, filename: Path) -> int:
+    output = subprocess.run([sys.executable, __file__, "--child", mode, str(filename)], check=True, capture_output=True, text=True).stdout
+    return int(output.split()[-1])  # kilobytes on Linux
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario, filename in _generate(Path(directory)).items():
+            before = _peak_rss("before", filename)
+            after = _peak_rss("after", filename)
+            print(f"{scenario:<10} ({filename.stat().st_size // (1024 * 1024)} MB): peak RSS before {before // 1024:6d} MB, after {after // 1024:6d} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,67 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPETITIONS = 20
+DATASET = Path(__file__).parent.parent / "tests" / "dataset" / "test-deployment-single.yaml"
+
+FAST_PATH = "from kubectl_fluidos import main; main()"
+FULL_PIPELINE = "import sys; import kubectl_fluidos.modelbased; from kubectl_fluidos import fluidos_kubectl_extension; raise SystemExit(fluidos_kubectl_extension(sys.argv, sys.stdin))"
+
+
+def _measure(command: list[str], env: dict[str, str]) -> float:
+    timings: list[float] = []
+
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as bin_dir:
+        # kubectl replacement, so that only the plugin overhead is measured
+        kubectl = Path(bin_dir) / "kubectl"
+        kubectl.write_text("#!/bin/sh\nexit 0\n")
+        kubectl.chmod(kubectl.stat().st_mode | stat.S_IEXEC)
+
+        env = dict(os.environ)
+        env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+
+        baseline = _measure([str(kubectl), "apply", "-f", str(DATASET)], env)
+        fast_path = _measure([sys.executable, "-c", FAST_PATH, "-f", str(DATASET)], env)
+        full_pipeline = _measure([sys.executable, "-c", FULL_PIPELINE, "-f", str(DATASET)], env)
+
+    print(f"kubectl apply (baseline):  {baseline * 1000:8.2f} ms")
+    print(f"passthrough fast path:     {fast_path * 1000:8.2f} ms (+{(fast_path - baseline) * 1000:.2f} ms)")
+    print(f"full pipeline:             {full_pipeline * 1000:8.2f} ms (+{(full_pipeline - baseline) * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
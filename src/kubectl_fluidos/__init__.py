@@ -17,30 +17,39 @@ limitations under the License.
 from __future__ import annotations
 
 import logging
+import mmap
 import os
+import re
+import stat
+import subprocess
 import sys
 from collections.abc import Callable
+from enum import auto
+from enum import Enum
+from importlib import import_module
 from typing import Any
 from typing import TextIO
 
-import yaml
 
-from .modelbased import ModelBasedOrchestratorConfiguration
-from .modelbased import ModelBasedOrchestratorProcessor
-from .mspl import MSPLProcessor
-from .mspl import MSPLProcessorConfiguration
+logger = logging.getLogger(__name__)
 
-try:
-    from yaml import CLoader as Loader
-except ImportError:
-    from yaml import Loader  # type: ignore
 
-from xml.etree import ElementTree
-from enum import Enum
-from enum import auto
+# the processors depend on the kubernetes client, whose import alone costs
+# hundreds of milliseconds, hence they are loaded only when first accessed
+_LAZY_ATTRIBUTES: dict[str, str] = {
+    "FLUIDOSClient": ".client",
+    "fluidos_kubectl_extension_async": ".pipeline",
+    "ModelBasedOrchestratorConfiguration": ".modelbased",
+    "ModelBasedOrchestratorProcessor": ".modelbased",
+    "MSPLProcessor": ".mspl",
+    "MSPLProcessorConfiguration": ".mspl",
+}
 
 
-logger = logging.getLogger(__name__)
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class InputFormat(Enum):
@@ -49,9 +58,15 @@ class InputFormat(Enum):
 
 
 INTENT_K8S_KEYWORD = "fluidos-intent-"  # label to be confirmed
+PRUNE_OPTION = "--fluidos-prune"
+# options understood only by the plugin, never forwarded to kubectl
+PLUGIN_OPTIONS_WITH_VALUE = ("--mspl-hostname", "--mspl-port", "--mspl-schema", "--mspl-url", "--mspl-selector", "--mspl-discovery-ttl")
+_INTENT_K8S_KEYWORD_BYTES = INTENT_K8S_KEYWORD.encode("utf-8")
+_XML_DOCUMENT_START = re.compile(rb"\A(?:\xef\xbb\xbf)?\s*<")
+_XML_SNIFF_SIZE = 64 * 1024
 
 
-def _is_YAML(data: str) -> bool:
+def _is_YAML(data: str | bytes) -> bool:
     try:
         _ = _to_YAML(data)
         return True
@@ -60,7 +75,9 @@ def _is_YAML(data: str) -> bool:
     return False
 
 
-def _is_XML(data: str) -> bool:
+def _is_XML(data: str | bytes) -> bool:
+    from xml.etree import ElementTree
+
     try:
         _ = ElementTree.fromstring(data)
         return True
@@ -69,34 +86,71 @@ def _is_XML(data: str) -> bool:
     return False
 
 
-def _to_YAML(data: str) -> dict[str, Any]:
+def _to_YAML(data: str | bytes) -> dict[str, Any]:
+    import yaml
+
+    try:
+        from yaml import CLoader as Loader
+    except ImportError:
+        from yaml import Loader  # type: ignore
+
     return yaml.load(data, Loader=Loader)
 
 
-def _check_input_format(input_data: str) -> tuple[InputFormat, dict[str, Any]]:
+def _check_input_format(input_data: str | bytes) -> tuple[InputFormat, dict[str, Any]]:
     if _is_XML(input_data):
         return (InputFormat.MSPL, dict())
-    elif _is_YAML(input_data):
-        return (InputFormat.K8S, _to_YAML(input_data))
+
+    from .parsers import load_document
+
+    try:
+        # JSON or YAML, parsed once with the fastest available backend
+        return (InputFormat.K8S, load_document(input_data))
+    except Exception as e:
+        logger.info(str(e))
+
     raise ValueError("Unknown format")
 
 
 def _has_intent_defined(spec: dict[str, Any]) -> bool:
-    annotations: dict[str, str] = spec.get("metadata", dict()).get("annotations", dict())
-    key: str
-
-    for key in annotations.keys():
-        if key.startswith(INTENT_K8S_KEYWORD):
-            return True
+    from .intents import has_intents
 
-    return False
+    # top level metadata as well as pod templates, according to the routing rules
+    return has_intents(spec)
 
 
-def _read_file_argument_content(filename: str) -> str:
-    with open(filename) as input_file:
+def _read_file_argument_content(filename: str) -> bytes:
+    with open(filename, "rb") as input_file:
         return input_file.read()
 
 
+def _map_file_argument_content(filename: str) -> bytes | mmap.mmap:
+    # read only mapping, the content is paged in by the OS only when accessed
+    with open(filename, "rb") as input_file:
+        status = os.fstat(input_file.fileno())
+        if not stat.S_ISREG(status.st_mode):
+            # pipes, FIFOs and devices (e.g., process substitution) cannot be mapped
+            return input_file.read()
+        if status.st_size == 0:
+            return b""
+        return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _looks_like_XML(data: bytes | mmap.mmap) -> bool:
+    # only the beginning of the document is parsed, without building the whole tree
+    if _XML_DOCUMENT_START.match(data) is None:
+        return False
+
+    from xml.etree import ElementTree
+
+    parser = ElementTree.XMLPullParser(events=("start",))
+    try:
+        parser.feed(data[:_XML_SNIFF_SIZE])
+        return any(True for _ in parser.read_events())
+    except ElementTree.ParseError:
+        return False
+
+
 def _attempt_reading_from_stdio(stdin: TextIO) -> str:
     if stdin.isatty():
         return ''
@@ -104,8 +158,8 @@ def _attempt_reading_from_stdio(stdin: TextIO) -> str:
         return stdin.read()
 
 
-def _extract_input_data(arguments: list[str], stdin: TextIO) -> tuple[list[str], str | None]:
-    input_data: list[str] = [
+def _extract_input_data(arguments: list[str], stdin: TextIO) -> tuple[list[bytes], str | None]:
+    input_data: list[bytes] = [
         _read_file_argument_content(arguments[idx + 1]) for idx, arg in enumerate(arguments) if (arg == "-f" or arg == "--filename") and idx + 1 < len(arguments)
     ]
 
@@ -120,6 +174,93 @@ def _extract_input_data(arguments: list[str], stdin: TextIO) -> tuple[list[str],
     raise ValueError("No input provided")
 
 
+def _has_fluidos_markers(data: bytes | mmap.mmap) -> bool:
+    # cheap byte level check, false positives are resolved by the full parsing
+    return _XML_DOCUMENT_START.match(data) is not None or data.find(_INTENT_K8S_KEYWORD_BYTES) != -1
+
+
+def _normalize_arguments(arguments: list[str]) -> list[str]:
+    """
+    Splits the attached forms of the input options (i.e., `--filename=X`, `-fX`, `-f=X`,
+    `--kustomize=X`, `-kX`, and `-k=X`) into an option followed by its value.
+    """
+    normalized: list[str] = []
+
+    for arg in arguments:
+        for option, short in (("--filename", "-f"), ("--kustomize", "-k")):
+            if arg.startswith(option + "="):
+                normalized += [option, arg[len(option) + 1:]]
+                break
+            if arg.startswith(short) and arg != short:
+                normalized += [short, arg[len(short) + 1:] if arg.startswith(short + "=") else arg[len(short):]]
+                break
+        else:
+            normalized.append(arg)
+
+    return normalized
+
+
+def _can_passthrough(arguments: list[str]) -> bool:
+    arguments = _normalize_arguments(arguments)
+    filenames: list[str] = []
+    skip = False
+
+    for idx, arg in enumerate(arguments):
+        if skip:
+            skip = False
+        elif arg in ("-f", "--filename") and idx + 1 < len(arguments):
+            filenames.append(arguments[idx + 1])
+            skip = True
+        elif arg in ("-k", "--kustomize", PRUNE_OPTION) or arg.startswith(PRUNE_OPTION):
+            # kustomizations and pruning are handled by the full pipeline
+            return False
+        elif arg.startswith("-") and not arg.startswith("--") and len(arg) > 2 and ("f" in arg or "k" in arg):
+            # combined short options (e.g., -Rf) are not parsed here, fail closed
+            return False
+
+    if not len(filenames):
+        # input from stdin is handled by the full pipeline
+        return False
+
+    for filename in filenames:
+        try:
+            # the content of pipes and FIFOs is consumed when read, it must reach the full pipeline
+            if not stat.S_ISREG(os.stat(filename).st_mode):
+                return False
+            data = _map_file_argument_content(filename)
+        except (OSError, ValueError):
+            return False
+
+        try:
+            if _has_fluidos_markers(data):
+                return False
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    return True
+
+
+def _strip_plugin_options(args: list[str]) -> list[str]:
+    stripped: list[str] = []
+    skip = False
+
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in PLUGIN_OPTIONS_WITH_VALUE:
+            skip = True
+        elif arg != PRUNE_OPTION and not arg.startswith(tuple(f"{option}=" for option in PLUGIN_OPTIONS_WITH_VALUE)):
+            stripped.append(arg)
+
+    return stripped
+
+
+def _exec_apply(args: list[str]) -> None:
+    # replaces the current process, stdin and the arguments are inherited by kubectl
+    os.execvp("kubectl", ["kubectl", "apply"] + _strip_plugin_options(args))
+
+
 def _is_deployment(spec: dict[str, Any]) -> bool:
     if type(spec) is dict:
         return spec.get("kind", None) == "Deployment"
@@ -130,11 +271,12 @@ def _behavior_not_defined() -> int:
     raise NotImplementedError()
 
 
-def _default_apply(args: list[str], stdin: str | None) -> int:
-    return os.system("kubectl apply " + " ".join(args))
+def _default_apply(args: list[str], stdin: str | bytes | None) -> int:
+    # no shell involved, arguments (e.g., file names) are passed as they are
+    return subprocess.run(["kubectl", "apply", *args], input=stdin.encode("utf-8") if isinstance(stdin, str) else stdin).returncode
 
 
-def fluidos_kubectl_extension(argv: list[str], stdin: TextIO, *, on_apply: Callable[[list[str], str | None], int] = _default_apply, on_mlps: Callable[..., int] = _behavior_not_defined, on_k8s_w_intent: Callable[..., int] = _behavior_not_defined) -> int:
+def fluidos_kubectl_extension(argv: list[str], stdin: TextIO, *, on_apply: Callable[[list[str], str | bytes | None], int] = _default_apply, on_mlps: Callable[..., int] = _behavior_not_defined, on_k8s_w_intent: Callable[..., int] = _behavior_not_defined) -> int:
     logger.info("Starting FLUIDOS kubectl extension")
 
     try:
@@ -143,7 +285,7 @@ def fluidos_kubectl_extension(argv: list[str], stdin: TextIO, *, on_apply: Calla
         print("error: must specify one of -f and -k", file=sys.stderr)
         return 1
 
-    data: str | None = None
+    data: str | bytes | None = None
 
     if stdin_data:
         data = stdin_data
@@ -171,16 +313,48 @@ def fluidos_kubectl_extension(argv: list[str], stdin: TextIO, *, on_apply: Calla
 
     # if nothing else applies, fallback to vanilla kubectl apply behavior
     logger.info("Invoking kubectl apply")
-    return on_apply(argv[1:], stdin_data)
+    return on_apply(_strip_plugin_options(argv[1:]), stdin_data)
 
 
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in ("get", "delete"):
+        # output is written to stdout, hence logging is not configured
+        from .resources import fluidos_delete
+        from .resources import fluidos_get
+
+        raise SystemExit((fluidos_get if sys.argv[1] == "get" else fluidos_delete)(sys.argv[2:], sys.stdout))
+
+    if _can_passthrough(sys.argv[1:]):
+        try:
+            _exec_apply(sys.argv[1:])
+        except OSError as e:
+            print(f"error: unable to execute kubectl: {e}", file=sys.stderr)
+            raise SystemExit(127)
+
+    from logging.config import fileConfig
+
+    import pkg_resources
+
+    fileConfig(pkg_resources.resource_filename(__name__, "logging.conf"), disable_existing_loggers=False)
+
+    import asyncio
+
+    from .modelbased import ModelBasedOrchestratorConfiguration
+    from .modelbased import ModelBasedOrchestratorProcessor
+    from .mspl import MSPLProcessor
+    from .mspl import MSPLProcessorConfiguration
+    from .pipeline import fluidos_kubectl_extension_async
+    from .resources import build_pruner
+
     raise SystemExit(
-        fluidos_kubectl_extension(
-            sys.argv,
-            sys.stdin,
-            on_mlps=lambda x: MSPLProcessor(MSPLProcessorConfiguration.build_configuration(sys.argv))(x),
-            on_k8s_w_intent=lambda x: ModelBasedOrchestratorProcessor(ModelBasedOrchestratorConfiguration.build_configuration(sys.argv))(x)
+        asyncio.run(
+            fluidos_kubectl_extension_async(
+                sys.argv,
+                sys.stdin,
+                mspl_processor=lambda: MSPLProcessor(MSPLProcessorConfiguration.build_configuration(sys.argv)),
+                k8s_w_intent_processor=lambda: ModelBasedOrchestratorProcessor(ModelBasedOrchestratorConfiguration.build_configuration(sys.argv)),
+                on_prune=build_pruner(sys.argv) if PRUNE_OPTION in sys.argv else None
+            )
         )
     )
 
@@ -0,0 +1,108 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from io import StringIO
+from mmap import mmap
+from types import TracebackType
+from typing import Any
+from typing import TextIO
+
+from kubernetes.config import ConfigException
+
+from kubectl_fluidos import _default_apply
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.modelbased import ModelBasedOrchestratorConfiguration
+from kubectl_fluidos.modelbased import ModelBasedOrchestratorProcessor
+from kubectl_fluidos.mspl import MSPLProcessor
+from kubectl_fluidos.mspl import MSPLProcessorConfiguration
+from kubectl_fluidos.pipeline import fluidos_kubectl_extension_async
+
+
+logger = logging.getLogger(__name__)
+
+
+class FLUIDOSClient:
+    """
+    Reusable entry point for embedding the plugin in long running applications.
+
+    The client is built once, it holds the processors for both the Model-based and the
+    MSPL meta-orchestrators together with their connection pools, and it does not rely
+    on nor modify any global state. An instance can be invoked concurrently from
+    multiple threads, while asyncio code can use `process_async`.
+
+    Example:
+
+        with FLUIDOSClient.from_arguments(["--kubeconfig", "/path/to/kubeconfig"]) as fluidos:
+            fluidos(["kubectl-fluidos", "-f", "deployment.yaml"])
+            await fluidos.process_async(["kubectl-fluidos", "-f", "deployment.yaml"])
+    """
+    def __init__(self, model_based: ModelBasedOrchestratorConfiguration | None = None, mspl: MSPLProcessorConfiguration | None = None, *, on_apply: Callable[[list[str], str | bytes | None], int] = _default_apply):
+        self._model_based_processor = ModelBasedOrchestratorProcessor(model_based) if model_based is not None else None
+        self._mspl_processor = MSPLProcessor(mspl) if mspl is not None else None
+        self._on_apply = on_apply
+
+    @staticmethod
+    def from_arguments(args: list[str], *, on_apply: Callable[[list[str], str | bytes | None], int] = _default_apply) -> FLUIDOSClient:
+        try:
+            model_based: ModelBasedOrchestratorConfiguration | None = ModelBasedOrchestratorConfiguration.build_configuration(args)
+        except (RuntimeError, ConfigException):
+            logger.info("Kubernetes configuration not available, Model-based meta-orchestrator disabled")
+            model_based = None
+
+        return FLUIDOSClient(model_based, MSPLProcessorConfiguration.build_configuration(args), on_apply=on_apply)
+
+    def __call__(self, argv: list[str], stdin: TextIO | None = None, *, max_in_flight: int = 8) -> int:
+        # each calling thread runs its own event loop, the processors are shared
+        return asyncio.run(self.process_async(argv, stdin, max_in_flight=max_in_flight))
+
+    async def process_async(self, argv: list[str], stdin: TextIO | None = None, *, max_in_flight: int = 8) -> int:
+        return await fluidos_kubectl_extension_async(
+            argv,
+            stdin if stdin is not None else StringIO(),
+            on_apply=self._on_apply,
+            mspl_processor=lambda: self._process_mspl,
+            k8s_w_intent_processor=lambda: self._process_k8s_w_intent,
+            max_in_flight=max_in_flight
+        )
+
+    def _process_mspl(self, data: str | bytes | mmap) -> int:
+        if self._mspl_processor is None:
+            logger.error("MSPL meta-orchestrator not configured")
+            return 1
+        return self._mspl_processor(data)
+
+    def _process_k8s_w_intent(self, data: dict[str, Any] | str | bytes, intents: list[Intent] | None = None, labels: dict[str, str] | None = None) -> int:
+        if self._model_based_processor is None:
+            logger.error("Model-based meta-orchestrator not configured")
+            return 1
+        return self._model_based_processor(data, intents, labels)
+
+    def close(self) -> None:
+        if self._model_based_processor is not None:
+            self._model_based_processor.close()
+        if self._mspl_processor is not None:
+            self._mspl_processor.close()
+
+    def __enter__(self) -> FLUIDOSClient:
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> None:
+        self.close()
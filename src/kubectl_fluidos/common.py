@@ -14,7 +14,59 @@ See the License for the specific language governing permissions and
 limitations under the License.
 ------------------------------------------------------------------------------
 '''
+import hashlib
+import mmap
+import os
 from argparse import ArgumentParser
+from argparse import Namespace
+
+from kubernetes import config
+from kubernetes.client import Configuration
+from kubernetes.config import ConfigException
+from kubernetes.config import KUBE_CONFIG_DEFAULT_LOCATION
+
+
+SOURCE_LABEL = "fluidos.eu/source"
+SOURCE_SET_LABEL = "fluidos.eu/source-set"
+SOURCE_REVISION_LABEL = "fluidos.eu/source-revision"
+
+
+def source_label_value(filename: str) -> str:
+    # label values are limited to 63 characters, hence the path is hashed
+    return hashlib.sha256(os.path.abspath(filename).encode("utf-8")).hexdigest()[:32]
+
+
+def source_revision_label_value(data: str | bytes | mmap.mmap) -> str:
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()[:32]
+
+
+def cache_directory(*components: str) -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kubectl-fluidos", *components)
+
+
+MANIFEST_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+def manifest_files(path: str, recursive: bool = False) -> list[str]:
+    """
+    Expands a -f argument as kubectl does: files are returned as they are, while the
+    manifests (by extension) of a directory are listed, recursively if requested.
+    """
+    if not os.path.isdir(path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"the path \"{path}\" does not exist")
+        return [path]
+
+    filenames: list[str] = []
+
+    for root, directories, files in os.walk(path):
+        directories.sort()
+        filenames += [os.path.join(root, filename) for filename in sorted(files) if filename.endswith(MANIFEST_EXTENSIONS)]
+        if not recursive:
+            break
+
+    return filenames
 
 
 def k8sArgParser() -> ArgumentParser:
@@ -23,8 +75,34 @@ def k8sArgParser() -> ArgumentParser:
     parser.add_argument("--kubeconfig", required=False, default="")
     parser.add_argument("--context", required=False, default="")
     parser.add_argument("--cluster", required=False, default="")
-    parser.add_argument("--namespace", required=False, default="default")
+    parser.add_argument("-n", "--namespace", required=False, default="default")
     parser.add_argument("--username", required=False, default="")
     parser.add_argument("--password", required=False, default="")
 
     return parser
+
+
+def load_k8s_configuration(k8s_args: Namespace) -> Configuration:
+    # loads into a private configuration object, the client wide default is never modified
+    configuration = Configuration()
+
+    # same lookup as config.load_config, which however reports the in-cluster fallback on stdout
+    if k8s_args.kubeconfig or os.path.exists(os.path.expanduser(KUBE_CONFIG_DEFAULT_LOCATION)):
+        config.load_kube_config(config_file=k8s_args.kubeconfig or None, context=k8s_args.context or None, client_configuration=configuration)
+    else:
+        config.load_incluster_config(client_configuration=configuration)
+
+    return configuration
+
+
+def k8s_context_name(k8s_args: Namespace) -> str:
+    # context selected by load_k8s_configuration, empty when running in-cluster
+    if k8s_args.context:
+        return str(k8s_args.context)
+
+    try:
+        contexts, active_context = config.list_kube_config_contexts(config_file=k8s_args.kubeconfig or None)
+    except (ConfigException, OSError):
+        return ""
+
+    return str(active_context["name"]) if active_context else ""
@@ -0,0 +1,150 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import logging
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from kubectl_fluidos import INTENT_K8S_KEYWORD
+
+
+logger = logging.getLogger(__name__)
+
+
+ANY = "*"
+
+_QUANTITY = re.compile(r"\A\s*([+-]?(?:\d+(?:\.\d*)?|\.\d+))\s*([A-Za-z%/]*)\s*\Z")
+
+_Path = tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """
+    Locations of the intents for the documents of a given apiVersion and kind, expressed
+    as dotted paths of annotation or label mappings. `ANY` matches every apiVersion or kind.
+    """
+    api_version: str
+    kind: str
+    paths: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Intent:
+    """
+    Intent declared by a document. Quantities (e.g., `100ms` or `100ops`) are split in
+    magnitude and unit, both are None for any other value (e.g., `Turin`).
+    """
+    name: str
+    value: str
+    magnitude: int | float | None
+    unit: str | None
+    path: str
+
+    @property
+    def key(self) -> str:
+        return INTENT_K8S_KEYWORD + self.name
+
+    def to_dictionary(self) -> dict[str, Any]:
+        return {"name": self.name, "value": self.value, "magnitude": self.magnitude, "unit": self.unit, "path": self.path}
+
+
+DEFAULT_ROUTING_RULES: tuple[RoutingRule, ...] = (
+    RoutingRule(ANY, ANY, ("metadata.annotations",)),
+    *(RoutingRule("apps/v1", kind, ("spec.template.metadata.annotations",)) for kind in ("Deployment", "StatefulSet", "DaemonSet", "ReplicaSet")),
+    RoutingRule("batch/v1", "Job", ("spec.template.metadata.annotations",)),
+    RoutingRule("batch/v1", "CronJob", ("spec.jobTemplate.metadata.annotations", "spec.jobTemplate.spec.template.metadata.annotations")),
+)
+
+
+def parse_quantity(value: str) -> tuple[int | float | None, str | None]:
+    match = _QUANTITY.match(value)
+    if match is None:
+        return (None, None)
+
+    number, unit = match.groups()
+    magnitude: int | float = float(number) if "." in number else int(number)
+
+    return (magnitude, unit or None)
+
+
+class RoutingTable:
+    """
+    Routing rules compiled into a dispatch table, mapping apiVersion and kind to the paths
+    holding intents. Each document costs a dictionary lookup plus the visit of its paths,
+    independently of the number of rules.
+    """
+    def __init__(self, rules: Iterable[RoutingRule]):
+        self._rules: dict[tuple[str, str], list[_Path]] = dict()
+
+        for rule in rules:
+            self._rules.setdefault((rule.api_version, rule.kind), []).extend(tuple(path.split(".")) for path in rule.paths)
+
+        self._table: dict[tuple[str, str], tuple[_Path, ...]] = dict()
+
+    def _compile(self, api_version: str, kind: str) -> tuple[_Path, ...]:
+        # from the most generic to the most specific rule, so that generic paths are visited first
+        paths: list[_Path] = []
+        for key in ((ANY, ANY), (api_version, ANY), (ANY, kind), (api_version, kind)):
+            paths += [path for path in self._rules.get(key, []) if path not in paths]
+        return tuple(paths)
+
+    def paths(self, api_version: str, kind: str) -> tuple[_Path, ...]:
+        try:
+            return self._table[(api_version, kind)]
+        except KeyError:
+            paths = self._table[(api_version, kind)] = self._compile(api_version, kind)
+            return paths
+
+    def _mappings(self, document: dict[str, Any]) -> Iterable[tuple[_Path, dict[str, Any]]]:
+        for path in self.paths(str(document.get("apiVersion", "")), str(document.get("kind", ""))):
+            value: Any = document
+            for key in path:
+                if type(value) is not dict:
+                    break
+                value = value.get(key)
+            if type(value) is dict:
+                yield (path, value)
+
+    def has_intents(self, document: dict[str, Any]) -> bool:
+        return any(type(key) is str and key.startswith(INTENT_K8S_KEYWORD) for _, mapping in self._mappings(document) for key in mapping)
+
+    def match(self, document: dict[str, Any]) -> list[Intent]:
+        intents: list[Intent] = []
+
+        for path, mapping in self._mappings(document):
+            for key, value in mapping.items():
+                if type(key) is not str or not key.startswith(INTENT_K8S_KEYWORD):
+                    continue
+                value = str(value)
+                intents.append(Intent(key[len(INTENT_K8S_KEYWORD):], value, *parse_quantity(value), ".".join(path)))
+
+        return intents
+
+
+DEFAULT_ROUTING_TABLE = RoutingTable(DEFAULT_ROUTING_RULES)
+
+
+def has_intents(document: dict[str, Any]) -> bool:
+    return DEFAULT_ROUTING_TABLE.has_intents(document)
+
+
+def match_intents(document: dict[str, Any]) -> list[Intent]:
+    return DEFAULT_ROUTING_TABLE.match(document)
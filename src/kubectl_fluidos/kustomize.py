@@ -0,0 +1,166 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from collections.abc import Iterator
+from typing import Any
+
+import yaml
+
+from kubectl_fluidos.common import cache_directory
+
+
+logger = logging.getLogger(__name__)
+
+
+KUSTOMIZATION_FILES = ("kustomization.yaml", "kustomization.yml", "Kustomization")
+
+_REFERENCE_KEYS = ("resources", "bases", "components")
+
+_REMOTE_PREFIXES = ("http://", "https://", "git@", "ssh://", "github.com/", "gitlab.com/")
+
+
+def _renderer() -> list[str]:
+    kustomize = shutil.which("kustomize")
+    if kustomize is not None:
+        return [kustomize, "build"]
+
+    kubectl = shutil.which("kubectl")
+    if kubectl is not None:
+        return [kubectl, "kustomize"]
+
+    raise RuntimeError("Neither kustomize nor kubectl available to render kustomizations")
+
+
+def _strings(value: Any) -> Iterator[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def _hash_path(path: str, digest: Any, visited: set[str]) -> bool:
+    """
+    Adds the content of a file, or of a directory tree, to the digest, following the
+    local paths referenced by kustomization files. Returns False when the rendering
+    depends on remote resources, hence it cannot be cached.
+    """
+    path = os.path.realpath(path)
+    if path in visited:
+        return True
+    visited.add(path)
+
+    if os.path.isfile(path):
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as input_file:
+            digest.update(hashlib.sha256(input_file.read()).digest())
+        return True
+
+    for root, directories, files in os.walk(path):
+        directories[:] = sorted(directory for directory in directories if not directory.startswith("."))
+        for filename in sorted(files):
+            if not _hash_path(os.path.join(root, filename), digest, visited):
+                return False
+
+    for filename in KUSTOMIZATION_FILES:
+        kustomization_file = os.path.join(path, filename)
+        if not os.path.isfile(kustomization_file):
+            continue
+
+        try:
+            with open(kustomization_file, "rb") as input_file:
+                kustomization = yaml.safe_load(input_file)
+        except yaml.YAMLError:
+            # not cached, the rendering reports the error
+            return False
+
+        if type(kustomization) is not dict:
+            return False
+
+        for key in _REFERENCE_KEYS:
+            for value in _strings(kustomization.get(key)):
+                # anything not available locally is remote (URLs, go-getter and repository references)
+                if not os.path.exists(os.path.join(path, value)):
+                    return False
+
+        # any value resolving to a local path is a dependency (resources, patches, generators, ...)
+        for value in _strings(kustomization):
+            if value.startswith(_REMOTE_PREFIXES):
+                return False
+            reference = os.path.join(path, value)
+            if os.path.exists(reference) and not _hash_path(reference, digest, visited):
+                return False
+
+    return True
+
+
+def kustomization_digest(directory: str, renderer: list[str]) -> str | None:
+    digest = hashlib.sha256()
+
+    # rendering depends on the tool as well
+    digest.update(" ".join(renderer).encode("utf-8"))
+    digest.update(str(os.stat(renderer[0]).st_mtime_ns).encode("utf-8"))
+
+    if not _hash_path(directory, digest, set()):
+        return None
+
+    return digest.hexdigest()
+
+
+def render_kustomization(directory: str) -> bytes:
+    """
+    Renders a kustomization with the locally available tooling. The output is cached on
+    disk, keyed by the content of the kustomization and of its local dependencies.
+    """
+    renderer = _renderer()
+    key = kustomization_digest(directory, renderer)
+    cache_file = os.path.join(cache_directory("kustomize"), f"{key}.yaml") if key is not None else None
+
+    if cache_file is not None:
+        try:
+            with open(cache_file, "rb") as input_file:
+                logger.info(f"Using cached rendering of {directory}")
+                return input_file.read()
+        except OSError:
+            pass
+
+    logger.info(f"Rendering kustomization {directory}")
+    result = subprocess.run(renderer + [directory], capture_output=True)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Unable to render {directory}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+
+    if cache_file is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_file), delete=False) as output_file:
+                output_file.write(result.stdout)
+            os.replace(output_file.name, cache_file)
+        except OSError as e:
+            logger.debug(f"Unable to cache rendering of {directory}: {e}")
+
+    return result.stdout
@@ -16,26 +16,40 @@ limitations under the License.
 '''
 from __future__ import annotations
 
-import logging.config
+import json
+import logging
 from argparse import ArgumentParser
 from dataclasses import dataclass
 from typing import Any
 
-import pkg_resources
 import yaml
 from kubernetes import client
-from kubernetes import config
 from kubernetes.client import Configuration
 from kubernetes.client.exceptions import ApiException
 from kubernetes.config import ConfigException
+from urllib3.exceptions import HTTPError
 
 from kubectl_fluidos.common import k8sArgParser
-
-logging.config.fileConfig(pkg_resources.resource_filename(__name__, "logging.conf"))
+from kubectl_fluidos.common import load_k8s_configuration
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.intents import match_intents
+from kubectl_fluidos.parsers import load_document
 
 logger = logging.getLogger(__name__)
 
 
+WARM_UP_TIMEOUT = 3.0  # seconds
+
+FLUIDOS_DEPLOYMENT_GROUP = "fluidos.eu"
+FLUIDOS_DEPLOYMENT_VERSION = "v1"
+FLUIDOS_DEPLOYMENT_PLURAL = "fluidosdeployments"
+
+MANAGED_BY_LABEL = "app.kubernetes.io/managed-by"
+MANAGED_BY_VALUE = "kubectl-fluidos"
+
+INTENTS_ANNOTATION = "fluidos.eu/intents"
+
+
 @dataclass
 class ModelBasedOrchestratorConfiguration:
     configuration: Configuration | None = None
@@ -47,21 +61,7 @@ class ModelBasedOrchestratorConfiguration:
             k8s_args, remaining_args = k8sArgParser().parse_known_args(args)
             # missing expanding load configuration from provided command line options
 
-            loading_args = {}
-
-            if k8s_args.kubeconfig:
-                loading_args["config_file"] = k8s_args.kubeconfig
-
-            config.load_config(**loading_args)
-
-            try:
-                c = Configuration().get_default_copy()
-            except AttributeError:
-                c = Configuration()
-                c.assert_hostname = False
-            Configuration.set_default(c)
-
-            return ModelBasedOrchestratorConfiguration(configuration=c, namespace=k8s_args.namespace)
+            return ModelBasedOrchestratorConfiguration(configuration=load_k8s_configuration(k8s_args), namespace=k8s_args.namespace)
         except ConfigException as e:
             print(f"Nothing to do here\n{e=}")
 
@@ -69,14 +69,31 @@ class ModelBasedOrchestratorConfiguration:
 
 
 class ModelBasedOrchestratorProcessor:
+    """
+    Creates FLUIDOSDeployment resources from manifests with intents.
+
+    The underlying API client pools its connections and holds no per request state,
+    hence a single instance can be shared across threads.
+    """
     def __init__(self, configuration: ModelBasedOrchestratorConfiguration = ModelBasedOrchestratorConfiguration(None)):
         self._configuration = configuration
         self._k8s_client = client.ApiClient(self._configuration.configuration)
+        self._custom_objects_api = client.CustomObjectsApi(self._k8s_client)
 
-    def __call__(self, data: str | bytes) -> int:
+    def close(self) -> None:
+        self._k8s_client.close()
+
+    def warm_up(self) -> None:
+        # establishes a pooled connection (including TLS handshake) ahead of the first request
+        try:
+            client.VersionApi(self._k8s_client).get_code(_request_timeout=(WARM_UP_TIMEOUT, WARM_UP_TIMEOUT))
+        except (ApiException, HTTPError) as e:
+            logger.debug(f"Unable to warm up connection to the API server {e=}")
+
+    def __call__(self, data: dict[str, Any] | str | bytes, intents: list[Intent] | None = None, labels: dict[str, str] | None = None) -> int:
         logger.info("Wrapping request")
         try:
-            request = _request_to_dictionary(data)
+            request = _request_to_dictionary(data, intents, labels)
         except TypeError as e:
             logger.error("Error processing requeest, possibly malformed")
             logger.debug(f"Error message {e=}")
@@ -85,14 +102,20 @@ class ModelBasedOrchestratorProcessor:
         logger.debug(f"{yaml.safe_dump(request)}")
 
         try:
-            response = client.CustomObjectsApi(self._k8s_client).create_namespaced_custom_object(
-                group="fluidos.eu",
-                version="v1",
-                namespace=self._configuration.namespace,
-                plural="fluidosdeployments",
-                body=request,
-                async_req=False
-            )
+            try:
+                response = self._custom_objects_api.create_namespaced_custom_object(
+                    group=FLUIDOS_DEPLOYMENT_GROUP,
+                    version=FLUIDOS_DEPLOYMENT_VERSION,
+                    namespace=self._configuration.namespace,
+                    plural=FLUIDOS_DEPLOYMENT_PLURAL,
+                    body=request,
+                    async_req=False
+                )
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                logger.info("FLUIDOSDeployment resource already existing, replacing it")
+                response = self._replace(request)
         except ApiException as e:
             logger.error("Unable to create a FLUIDOSDeployment resource for current request")
             logger.debug(f"Response error: {e=}")
@@ -102,18 +125,56 @@ class ModelBasedOrchestratorProcessor:
 
         return 0
 
-
-def _request_to_dictionary(data: str | bytes) -> dict[str, Any]:
+    def _replace(self, request: dict[str, Any]) -> Any:
+        # replaced rather than patched, merge patches never remove what the manifest no longer has
+        current = self._custom_objects_api.get_namespaced_custom_object(
+            group=FLUIDOS_DEPLOYMENT_GROUP,
+            version=FLUIDOS_DEPLOYMENT_VERSION,
+            namespace=self._configuration.namespace,
+            plural=FLUIDOS_DEPLOYMENT_PLURAL,
+            name=request["metadata"]["name"]
+        )
+
+        request["metadata"]["resourceVersion"] = current["metadata"]["resourceVersion"]
+        if "finalizers" in current["metadata"]:
+            # owned by controllers, not by the manifest
+            request["metadata"]["finalizers"] = current["metadata"]["finalizers"]
+
+        return self._custom_objects_api.replace_namespaced_custom_object(
+            group=FLUIDOS_DEPLOYMENT_GROUP,
+            version=FLUIDOS_DEPLOYMENT_VERSION,
+            namespace=self._configuration.namespace,
+            plural=FLUIDOS_DEPLOYMENT_PLURAL,
+            name=request["metadata"]["name"],
+            body=request
+        )
+
+
+def _request_to_dictionary(data: dict[str, Any] | str | bytes, intents: list[Intent] | None = None, labels: dict[str, str] | None = None) -> dict[str, Any]:
     logger.info("Converting to dictionary and augmenting")
-    request_as_yaml: dict[str, Any] = _extract_request(data)
+    # manifests routed by the pipeline are already parsed, raw ones come from the legacy entry point
+    request_as_yaml: dict[str, Any] = data if isinstance(data, dict) else _extract_request(data)
 
     logger.debug(f"{request_as_yaml=}")
 
+    if intents is None:
+        intents = match_intents(request_as_yaml)
+
     request_to_dictionary = {
-        "apiVersion": "fluidos.eu/v1",
+        "apiVersion": f"{FLUIDOS_DEPLOYMENT_GROUP}/{FLUIDOS_DEPLOYMENT_VERSION}",
         "kind": "FLUIDOSDeployment",
         "metadata": {
-            "name": request_as_yaml["metadata"]["name"]
+            "name": request_as_yaml["metadata"]["name"],
+            "labels": {
+                **(request_as_yaml["metadata"].get("labels") or {}),
+                # source labels only on the FLUIDOSDeployment, the wrapped manifest is left as provided
+                **(labels or {}),
+                MANAGED_BY_LABEL: MANAGED_BY_VALUE
+            },
+            "annotations": {
+                # intents found anywhere in the manifest, already parsed for the meta-orchestrator
+                INTENTS_ANNOTATION: json.dumps([intent.to_dictionary() for intent in intents], separators=(",", ":"))
+            }
         },
         "spec": request_as_yaml
     }
@@ -122,7 +183,7 @@ def _request_to_dictionary(data: str | bytes) -> dict[str, Any]:
 
 
 def _extract_request(data: str | bytes) -> dict[str, Any]:
-    return yaml.safe_load(data)
+    return load_document(data)
 
 
 def _modelBasedArgParser() -> ArgumentParser:
@@ -16,25 +16,50 @@ limitations under the License.
 '''
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
 from argparse import ArgumentParser
 from dataclasses import dataclass
+from dataclasses import replace
+from mmap import mmap
 from typing import Any
 
-from kubernetes import config
+from kubernetes import client
 from kubernetes.client import Configuration
+from kubernetes.client.exceptions import ApiException
 from kubernetes.config import ConfigException
-from requests import post
+from requests import Session
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError
 from requests.exceptions import InvalidURL
 from requests.exceptions import MissingSchema
+from requests.exceptions import RequestException
+from urllib3.exceptions import HTTPError
 
+from kubectl_fluidos.common import cache_directory
+from kubectl_fluidos.common import k8s_context_name
 from kubectl_fluidos.common import k8sArgParser
+from kubectl_fluidos.common import load_k8s_configuration
 
 
 logger = logging.getLogger(__name__)
 
 
+WARM_UP_TIMEOUT = 3.0  # seconds
+DISCOVERY_TIMEOUT = 3.0  # seconds
+DISCOVERY_TTL = 3600.0  # seconds
+
+MSPL_SERVICE_SELECTOR = "fluidos.eu/mspl-orchestrator"
+MSPL_URL_ANNOTATION = "fluidos.eu/mspl-url"
+MSPL_PORT_ANNOTATION = "fluidos.eu/mspl-port"
+MSPL_PATH_ANNOTATION = "fluidos.eu/mspl-path"
+
+
 def msplArgParser() -> ArgumentParser:
     parser = ArgumentParser()
 
@@ -42,6 +67,8 @@ def msplArgParser() -> ArgumentParser:
     parser.add_argument("--mspl-port", required=False, type=int)
     parser.add_argument("--mspl-schema", required=False, type=int)
     parser.add_argument("--mspl-url", required=False, type=str)
+    parser.add_argument("--mspl-selector", required=False, type=str, default=MSPL_SERVICE_SELECTOR)
+    parser.add_argument("--mspl-discovery-ttl", required=False, type=float, default=DISCOVERY_TTL)
 
     return parser
 
@@ -52,6 +79,7 @@ class MSPLProcessorConfiguration:
     port: int = 8002
     schema: str = "http"
     url: str | None = None
+    discovery_cache: str | None = None  # file caching the discovered URL, if any
 
     def get_url(self) -> str:
         if self.url:
@@ -59,6 +87,16 @@ class MSPLProcessorConfiguration:
         else:
             return f"{self.schema}://{self.hostname}:{self.port}/meservice"
 
+    def invalidate(self) -> None:
+        if self.discovery_cache is None:
+            return
+
+        logger.info("Invalidating the cached MSPL orchestration service URL")
+        try:
+            os.remove(self.discovery_cache)
+        except OSError:
+            pass
+
     @staticmethod
     def build_configuration(args: list[str]) -> MSPLProcessorConfiguration:
         namespace, remaining_args = msplArgParser().parse_known_args(args)
@@ -86,25 +124,15 @@ class MSPLProcessorConfiguration:
             k8s_args, remaining_args = k8sArgParser().parse_known_args(remaining_args)
             # missing expanding load configuration from provided command line options
 
-            loading_args = {}
+            c = load_k8s_configuration(k8s_args)
 
-            if k8s_args.kubeconfig:
-                loading_args["config_file"] = k8s_args.kubeconfig
-
-            config.load_config(**loading_args)
-
-            try:
-                c = Configuration().get_default_copy()
-            except AttributeError:
-                c = Configuration()
-                c.assert_hostname = False
-            Configuration.set_default(c)
-
-            return MSPLProcessorConfiguration(
+            fallback = MSPLProcessorConfiguration(
                 hostname=MSPLProcessorConfiguration._extract_hostname(c.host),
                 port=8002,
                 schema="http"
             )
+
+            return _discover_configuration(c, fallback, namespace.mspl_selector, k8s_args.namespace, namespace.mspl_discovery_ttl, context=k8s_context_name(k8s_args))
         except ConfigException as e:
             logger.debug(f"Unable to load k8s configuration: {e}")
 
@@ -123,13 +151,155 @@ class MSPLProcessorConfiguration:
         raise ValueError("Unable to extract hostname properly")
 
 
+def _service_url(service: client.V1Service, api_hostname: str) -> str | None:
+    annotations = service.metadata.annotations or {}
+
+    if MSPL_URL_ANNOTATION in annotations:
+        return str(annotations[MSPL_URL_ANNOTATION])
+
+    ports = service.spec.ports or []
+    if not len(ports):
+        return None
+
+    wanted = annotations.get(MSPL_PORT_ANNOTATION)
+    port = next((port for port in ports if wanted is not None and wanted in (port.name, str(port.port))), ports[0])
+
+    schema = "https" if "https" in (port.name, port.app_protocol) else "http"
+    path = annotations.get(MSPL_PATH_ANNOTATION, "/meservice")
+
+    # only addresses reachable from outside the cluster, where the plugin usually runs
+    ingress = service.status.load_balancer.ingress if service.status is not None and service.status.load_balancer is not None else None
+    if service.spec.type == "LoadBalancer" and ingress:
+        return f"{schema}://{ingress[0].hostname or ingress[0].ip}:{port.port}{path}"
+
+    if service.spec.type in ("NodePort", "LoadBalancer") and port.node_port:
+        return f"{schema}://{api_hostname}:{port.node_port}{path}"
+
+    return None
+
+
+def discover_mspl_url(api: client.CoreV1Api, api_hostname: str, selector: str, namespace: str) -> str | None:
+    """
+    Looks up the Service of the MSPL orchestrator by label selector, across all the
+    namespaces if allowed, otherwise within the given one. The Service annotations can
+    override the URL (`fluidos.eu/mspl-url`), the port (`fluidos.eu/mspl-port`, name or
+    number), and the path (`fluidos.eu/mspl-path`). Returns None if no matching Service
+    is reachable from outside the cluster, i.e., a ClusterIP Service without URL annotation.
+    """
+    timeout = (DISCOVERY_TIMEOUT, DISCOVERY_TIMEOUT)
+
+    try:
+        services = api.list_service_for_all_namespaces(label_selector=selector, _request_timeout=timeout).items
+    except ApiException as e:
+        if e.status != 403:
+            raise
+        services = api.list_namespaced_service(namespace, label_selector=selector, _request_timeout=timeout).items
+
+    for service in sorted(services, key=lambda service: (service.metadata.namespace, service.metadata.name)):
+        url = _service_url(service, api_hostname)
+        if url is not None:
+            logger.info(f"Discovered MSPL orchestration service {service.metadata.namespace}/{service.metadata.name}")
+            return url
+
+    return None
+
+
+def _discovery_cache_file(configuration: Configuration, selector: str, context: str, namespace: str) -> str:
+    # one entry per cluster and credentials (i.e., context), the namespace is only used when
+    # Services cannot be listed across namespaces, it is part of the key nonetheless
+    key = hashlib.sha256(f"{configuration.host}\n{context}\n{namespace}\n{selector}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_directory("mspl"), f"{key}.json")
+
+
+def _read_discovery_cache(cache_file: str) -> str | None:
+    try:
+        with open(cache_file) as input_file:
+            entry = json.load(input_file)
+        if entry["expires"] > time.time():
+            return str(entry["url"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    return None
+
+
+def _write_discovery_cache(cache_file: str, url: str, ttl: float) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(cache_file), delete=False) as output_file:
+            json.dump({"url": url, "expires": time.time() + ttl}, output_file)
+        os.replace(output_file.name, cache_file)
+    except OSError as e:
+        logger.debug(f"Unable to cache the MSPL orchestration service URL: {e}")
+
+
+def _discover_configuration(configuration: Configuration, fallback: MSPLProcessorConfiguration, selector: str, namespace: str, ttl: float, *, context: str = "") -> MSPLProcessorConfiguration:
+    cache_file = _discovery_cache_file(configuration, selector, context, namespace)
+
+    url = _read_discovery_cache(cache_file)
+    if url is not None:
+        logger.debug(f"Using cached MSPL orchestration service URL {url}")
+        return MSPLProcessorConfiguration(url=url, discovery_cache=cache_file)
+
+    api_client = client.ApiClient(configuration)
+    try:
+        url = discover_mspl_url(client.CoreV1Api(api_client), fallback.hostname, selector, namespace)
+    except (ApiException, HTTPError) as e:
+        logger.info(f"Unable to discover the MSPL orchestration service, assuming {fallback.get_url()}: {e}")
+        return fallback
+    finally:
+        api_client.close()
+
+    if url is None:
+        # cached as well, so that clusters without the service do not pay the lookup on every run
+        logger.info(f"No MSPL orchestration service matching {selector}, assuming {fallback.get_url()}")
+        _write_discovery_cache(cache_file, fallback.get_url(), ttl)
+        return replace(fallback, discovery_cache=cache_file)
+
+    _write_discovery_cache(cache_file, url, ttl)
+
+    return MSPLProcessorConfiguration(url=url, discovery_cache=cache_file)
+
+
 class MSPLProcessor:
-    def __init__(self, configuration: MSPLProcessorConfiguration = MSPLProcessorConfiguration()):
+    """
+    Submits MSPL requests to the meta-orchestrator.
+
+    Each calling thread uses its own HTTP session, while the connection pool is shared
+    by all of them, hence a single instance can be shared across threads. Sessions are
+    held by their thread only, and released together with it.
+    """
+    def __init__(self, configuration: MSPLProcessorConfiguration = MSPLProcessorConfiguration(), pool_maxsize: int = 10):
         self.configuration = configuration
+        self._adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+        self._local = threading.local()
+
+    def close(self) -> None:
+        # sessions own no connection besides the ones of the shared adapter
+        self._adapter.close()
+
+    def warm_up(self) -> None:
+        # establishes a pooled connection (including TLS handshake) ahead of the first request
+        try:
+            self._session().head(self.configuration.get_url(), timeout=WARM_UP_TIMEOUT)
+        except RequestException as e:
+            logger.debug(f"Unable to warm up connection to the MSPL orchestration service {e}")
+
+    def _session(self) -> Session:
+        session: Session | None = getattr(self._local, "session", None)
+
+        if session is None:
+            session = Session()
+            # replaces the default adapters, hence the session holds no pool of its own
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+
+        return session
 
-    def __call__(self, data: str) -> int:
+    def __call__(self, data: str | bytes | mmap) -> int:
         try:
-            response = post(self.configuration.get_url(), headers=self._build_headers(), data=data)
+            response = self._session().post(self.configuration.get_url(), headers=self._build_headers(), data=data)
             if response.status_code == 200:
                 return 0
         except (MissingSchema, InvalidURL):
@@ -137,6 +307,8 @@ class MSPLProcessor:
             return 1
         except ConnectionError as e:
             logger.info(f"Error connecting to the MSPL orchestration service {e}")
+            # the service might have moved, the next run discovers it again
+            self.configuration.invalidate()
             return 1
 
         if int(response.status_code / 100) == 4:
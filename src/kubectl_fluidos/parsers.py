@@ -0,0 +1,168 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import re
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+    _YAML_BACKEND_NAME = "libyaml"
+except ImportError:
+    from yaml import SafeDumper  # type: ignore
+    from yaml import SafeLoader  # type: ignore
+    _YAML_BACKEND_NAME = "pyyaml"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+
+JSON = "json"
+YAML = "yaml"
+
+_JSON_DOCUMENT_START = re.compile(rb"\A(?:\xef\xbb\xbf)?\s*[{\[]")
+
+
+@dataclass(frozen=True)
+class ParserBackend:
+    """
+    Implementation of a manifest format. `load` parses a single document, `load_all`
+    every document of a stream, and `dump` serializes a document back to the format.
+    """
+    name: str
+    load: Callable[[Any], Any]
+    load_all: Callable[[Any], Iterable[Any]]
+    dump: Callable[[Any], str]
+
+
+_BACKENDS: dict[str, list[tuple[int, ParserBackend]]] = {JSON: [], YAML: []}
+
+
+def register_backend(format: str, backend: ParserBackend, priority: int = 0) -> None:
+    """
+    Makes a backend available for the given format, the one with highest priority is used.
+    """
+    _BACKENDS.setdefault(format, []).append((priority, backend))
+    _BACKENDS[format].sort(key=lambda entry: entry[0], reverse=True)
+
+
+def get_backend(format: str) -> ParserBackend:
+    try:
+        return _BACKENDS[format][0][1]
+    except (KeyError, IndexError):
+        raise ValueError(f"No parser backend available for {format}")
+
+
+def sniff_format(data: str | bytes | mmap.mmap) -> str:
+    if isinstance(data, str):
+        return JSON if data.lstrip("\ufeff \t\r\n")[:1] in ("{", "[") else YAML
+    return JSON if _JSON_DOCUMENT_START.match(data) is not None else YAML
+
+
+def _rewind(data: Any) -> Any:
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+    return data
+
+
+def _lines(data: str | bytes | mmap.mmap) -> Iterator[str | bytes]:
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        return iter(data.readline, b"")
+    return iter(data.splitlines())
+
+
+def _expand_lists(documents: Iterable[Any]) -> Iterator[Any]:
+    # kubectl accepts List kinds (e.g., List, DeploymentList) wrapping the actual manifests
+    for document in documents:
+        if type(document) is list:
+            yield from _expand_lists(document)
+        elif type(document) is dict and str(document.get("kind", "")).endswith("List") and type(document.get("items")) is list:
+            yield from _expand_lists(document["items"])
+        elif document is not None:
+            yield document
+
+
+def _load_json_documents(data: str | bytes | mmap.mmap) -> list[Any]:
+    backend = get_backend(JSON)
+
+    try:
+        return list(backend.load_all(data))
+    except ValueError:
+        pass
+
+    # JSON lines, one document per line
+    return [backend.load(line) for line in _lines(data) if line.strip()]
+
+
+def load_documents(data: str | bytes | mmap.mmap) -> tuple[str, list[Any]]:
+    """
+    Parses every document of the input, either JSON (including JSON lines) or YAML,
+    expanding List kinds. Returns the detected format together with the documents.
+    """
+    if sniff_format(data) == JSON:
+        try:
+            return (JSON, list(_expand_lists(_load_json_documents(data))))
+        except ValueError:
+            logger.debug("Not a JSON document, attempting YAML")
+
+    return (YAML, list(_expand_lists(get_backend(YAML).load_all(data))))
+
+
+def load_document(data: str | bytes | mmap.mmap) -> Any:
+    if sniff_format(data) == JSON:
+        try:
+            return get_backend(JSON).load(data)
+        except ValueError:
+            logger.debug("Not a JSON document, attempting YAML")
+
+    return get_backend(YAML).load(data)
+
+
+def _json_load(data: str | bytes | mmap.mmap) -> Any:
+    return json.loads(bytes(data) if isinstance(data, mmap.mmap) else data)
+
+
+register_backend(JSON, ParserBackend("json", _json_load, lambda data: [_json_load(data)], json.dumps))
+
+if orjson is not None:
+    def _orjson_load(data: str | bytes | mmap.mmap) -> Any:
+        return orjson.loads(memoryview(data) if isinstance(data, mmap.mmap) else data)
+
+    register_backend(JSON, ParserBackend("orjson", _orjson_load, lambda data: [_orjson_load(data)], lambda document: orjson.dumps(document).decode("utf-8")), priority=10)
+
+register_backend(YAML, ParserBackend(
+    _YAML_BACKEND_NAME,
+    lambda data: yaml.load(_rewind(data), Loader=SafeLoader),
+    lambda data: yaml.load_all(_rewind(data), Loader=SafeLoader),
+    lambda document: yaml.dump(document, Dumper=SafeDumper)
+))
@@ -0,0 +1,336 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import asyncio
+import logging
+import mmap
+import os
+import stat
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import TextIO
+
+import yaml
+
+from kubectl_fluidos import _default_apply
+from kubectl_fluidos import _INTENT_K8S_KEYWORD_BYTES
+from kubectl_fluidos import _looks_like_XML
+from kubectl_fluidos import _map_file_argument_content
+from kubectl_fluidos import _normalize_arguments
+from kubectl_fluidos import _strip_plugin_options
+from kubectl_fluidos import _XML_DOCUMENT_START
+from kubectl_fluidos.common import manifest_files
+from kubectl_fluidos.common import SOURCE_LABEL
+from kubectl_fluidos.common import source_label_value
+from kubectl_fluidos.common import SOURCE_REVISION_LABEL
+from kubectl_fluidos.common import source_revision_label_value
+from kubectl_fluidos.common import SOURCE_SET_LABEL
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.intents import match_intents
+from kubectl_fluidos.kustomize import render_kustomization
+from kubectl_fluidos.parsers import load_documents
+
+
+logger = logging.getLogger(__name__)
+
+
+# MSPL processors receive the bytes of the request, intent ones the parsed manifest together with its intents
+# and the labels identifying its source
+Processor = Callable[..., int]
+ProcessorFactory = Callable[[], Processor]
+
+
+@dataclass
+class _Input:
+    argument: str | None  # -f or -k value the input comes from, None when stdin is implied
+    filename: str | None  # manifest file or kustomization directory, None when read from stdin
+    data: bytes | mmap.mmap
+    mspl: list[bytes | mmap.mmap] = field(default_factory=list)
+    k8s_w_intent: list[tuple[dict[str, Any], list[Intent]]] = field(default_factory=list)
+    leftovers: list[Any] = field(default_factory=list)
+    streamed: bool = False  # stdin, pipes and FIFOs, whose content cannot be read again by kubectl
+
+    @property
+    def passthrough(self) -> bool:
+        return not len(self.mspl) and not len(self.k8s_w_intent)
+
+    def source_labels(self, set_labels: dict[str, dict[str, str]]) -> dict[str, str]:
+        # ownership of the resources created from a manifest file, used for deletion and pruning
+        if self.filename is None or self.argument not in set_labels:
+            return dict()
+        return {SOURCE_LABEL: source_label_value(self.filename), **set_labels[self.argument]}
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def _source_set_labels(inputs: list[_Input]) -> dict[str, dict[str, str]]:
+    """
+    Labels of each -f or -k argument (input set). The revision covers the routed files of the
+    whole set, hence pruning also removes the resources of manifests no longer part of it.
+    """
+    sets: dict[str, list[str]] = dict()
+
+    for input_data in inputs:
+        if input_data.argument is None or input_data.filename is None:
+            continue
+        revisions = sets.setdefault(input_data.argument, [])
+        if not input_data.passthrough:
+            revisions.append(f"{source_label_value(input_data.filename)}:{source_revision_label_value(input_data.data)}")
+
+    return {
+        argument: {SOURCE_SET_LABEL: source_label_value(argument), SOURCE_REVISION_LABEL: source_revision_label_value("\n".join(revisions))}
+        for argument, revisions in sets.items()
+    }
+
+
+def _read_stdin(stdin: TextIO) -> bytes:
+    return stdin.buffer.read() if hasattr(stdin, "buffer") else stdin.read().encode("utf-8")
+
+
+def _read_inputs(argv: list[str], stdin: TextIO) -> list[_Input]:
+    """
+    Reads every -f (files, directories, or stdin via `-f -`) and -k input. Unreadable
+    inputs raise, since handing them over to kubectl would apply intents as plain manifests.
+    """
+    inputs: list[_Input] = []
+    recursive = "-R" in argv or "--recursive" in argv or "--recursive=true" in argv
+
+    try:
+        for idx, arg in enumerate(argv):
+            if (arg == "-f" or arg == "--filename") and idx + 1 < len(argv):
+                if argv[idx + 1] == "-":
+                    inputs.append(_Input("-", None, _read_stdin(stdin), streamed=True))
+                    continue
+                for filename in manifest_files(argv[idx + 1], recursive):
+                    streamed = not stat.S_ISREG(os.stat(filename).st_mode)
+                    inputs.append(_Input(argv[idx + 1], filename, _map_file_argument_content(filename), streamed=streamed))
+            elif (arg == "-k" or arg == "--kustomize") and idx + 1 < len(argv):
+                inputs.append(_Input(argv[idx + 1], argv[idx + 1], render_kustomization(argv[idx + 1])))
+    except BaseException:
+        for input_data in inputs:
+            input_data.close()
+        raise
+
+    if not len(inputs) and not stdin.isatty():
+        stdin_data = _read_stdin(stdin)
+        if stdin_data:
+            inputs.append(_Input(None, None, stdin_data, streamed=True))
+
+    return inputs
+
+
+def _route(inputs: list[_Input]) -> None:
+    for input_data in inputs:
+        if _looks_like_XML(input_data.data):
+            input_data.mspl.append(input_data.data)
+            continue
+
+        if input_data.data.find(_INTENT_K8S_KEYWORD_BYTES) == -1:
+            # no document can have intents, left to kubectl without parsing
+            continue
+
+        try:
+            _, documents = load_documents(input_data.data)
+        except (yaml.YAMLError, ValueError) as e:
+            logger.info(f"Unknown format, fallback to apply: {e}")
+            continue
+
+        for document in documents:
+            intents = match_intents(document) if type(document) is dict else []
+            if len(intents):
+                # handed over as parsed, the processor neither parses nor scans the manifest again
+                input_data.k8s_w_intent.append((document, intents))
+            else:
+                input_data.leftovers.append(document)
+
+
+def _build_apply_request(argv: list[str], inputs: list[_Input]) -> tuple[list[str], str | bytes | None] | None:
+    # arguments with at least a routed or streamed input are replaced by their remaining files, if any
+    routed_arguments = {input_data.argument for input_data in inputs if not input_data.passthrough or input_data.streamed}
+    leftovers = [document for input_data in inputs if not input_data.passthrough for document in input_data.leftovers]
+    # streamed inputs were consumed while reading, their content is forwarded via stdin
+    streamed = [bytes(input_data.data) for input_data in inputs if input_data.streamed and input_data.passthrough]
+    raw_stdin: bytes | None = b"\n---\n".join(streamed) if len(streamed) else None
+
+    args: list[str] = []
+    has_files = False
+    skip = False
+
+    argv = argv[:1] + _strip_plugin_options(argv[1:])
+
+    for idx, arg in enumerate(argv[1:], start=1):
+        if skip:
+            skip = False
+        elif (arg == "-f" or arg == "--filename" or arg == "-k" or arg == "--kustomize") and idx + 1 < len(argv):
+            skip = True
+            if argv[idx + 1] == "-":
+                continue  # stdin is provided once, together with the leftovers
+            if argv[idx + 1] not in routed_arguments:
+                args += [arg, argv[idx + 1]]
+                has_files = True
+                continue
+            for input_data in inputs:
+                if input_data.argument == argv[idx + 1] and input_data.passthrough and not input_data.streamed and input_data.filename != input_data.argument:
+                    args += ["-f", str(input_data.filename)]
+                    has_files = True
+        else:
+            args.append(arg)
+
+    stdin_data: str | bytes | None = raw_stdin
+
+    if len(leftovers):
+        dumped_leftovers = yaml.safe_dump_all(leftovers)
+        stdin_data = dumped_leftovers if raw_stdin is None else raw_stdin + b"\n---\n" + dumped_leftovers.encode("utf-8")
+
+    if stdin_data is not None:
+        return (args + ["-f", "-"], stdin_data)
+    if has_files:
+        return (args, None)
+
+    return None
+
+
+def _prepare(factory: ProcessorFactory | None) -> asyncio.Task[Processor] | None:
+    if factory is None:
+        return None
+
+    task = asyncio.create_task(asyncio.to_thread(factory))
+    # failures are reported by the submissions, if any is using the processor
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    return task
+
+
+async def _build_and_warm_up(processor_task: asyncio.Task[Processor]) -> Processor:
+    processor = await processor_task
+
+    warm_up: Callable[[], None] | None = getattr(processor, "warm_up", None)
+    if warm_up is not None:
+        await asyncio.to_thread(warm_up)
+
+    return processor
+
+
+def _warm_up(processor_task: asyncio.Task[Processor] | None, needed: bool) -> asyncio.Task[Processor] | None:
+    if processor_task is None or not needed:
+        return processor_task
+
+    task = asyncio.create_task(_build_and_warm_up(processor_task))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    return task
+
+
+async def _submit(processor_task: asyncio.Task[Processor] | None, semaphore: asyncio.Semaphore, *args: Any) -> int:
+    if processor_task is None:
+        logger.error("No meta-orchestrator configured for the request")
+        return 1
+
+    try:
+        processor = await processor_task
+    except Exception as e:
+        logger.error(f"Unable to configure the meta-orchestrator: {e}")
+        return 1
+
+    async with semaphore:
+        return await asyncio.to_thread(processor, *args)
+
+
+async def fluidos_kubectl_extension_async(argv: list[str], stdin: TextIO, *, on_apply: Callable[[list[str], str | bytes | None], int] = _default_apply, mspl_processor: ProcessorFactory | None = None, k8s_w_intent_processor: ProcessorFactory | None = None, on_prune: Callable[[str], int] | None = None, max_in_flight: int = 8) -> int:
+    """
+    Asyncio counterpart of `fluidos_kubectl_extension`, routing every document of the input.
+
+    The processors are provided as factories, they are built (i.e., configuration loading) while
+    the input is being read, and their connections are warmed up while the input is being parsed,
+    only if the raw input hints that they are needed. MSPL and intent documents are submitted concurrently, at most
+    `max_in_flight` at a time, while the remaining documents are handed over to `on_apply`.
+
+    When `on_prune` is provided, and every submission succeeded, it is invoked with the label
+    selector of the resources created from previous revisions of each -f or -k argument.
+    """
+    logger.info("Starting FLUIDOS kubectl extension")
+
+    argv = argv[:1] + _normalize_arguments(argv[1:])
+
+    mspl_task = _prepare(mspl_processor)
+    k8s_w_intent_task = _prepare(k8s_w_intent_processor)
+
+    try:
+        inputs = await asyncio.to_thread(_read_inputs, argv, stdin)
+    except (OSError, RuntimeError, yaml.YAMLError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    if not len(inputs):
+        print("error: must specify one of -f and -k", file=sys.stderr)
+        return 1
+
+    try:
+        return await _process(argv, inputs, on_apply, mspl_task, k8s_w_intent_task, on_prune, max_in_flight)
+    finally:
+        for input_data in inputs:
+            input_data.close()
+
+
+async def _process(argv: list[str], inputs: list[_Input], on_apply: Callable[[list[str], str | bytes | None], int], mspl_task: asyncio.Task[Processor] | None, k8s_w_intent_task: asyncio.Task[Processor] | None, on_prune: Callable[[str], int] | None, max_in_flight: int) -> int:
+    # cheap check on the raw content, false positives only cost an unused connection
+    mspl_task = _warm_up(mspl_task, any(_XML_DOCUMENT_START.match(input_data.data) for input_data in inputs))
+    k8s_w_intent_task = _warm_up(k8s_w_intent_task, any(input_data.data.find(_INTENT_K8S_KEYWORD_BYTES) != -1 for input_data in inputs))
+
+    await asyncio.to_thread(_route, inputs)
+    set_labels = await asyncio.to_thread(_source_set_labels, inputs)
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    submissions = [
+        _submit(mspl_task, semaphore, data) for input_data in inputs for data in input_data.mspl
+    ] + [
+        _submit(k8s_w_intent_task, semaphore, data, intents, input_data.source_labels(set_labels)) for input_data in inputs for data, intents in input_data.k8s_w_intent
+    ]
+
+    logger.info(f"Invoking meta-orchestrators for {len(submissions)} request(s)")
+
+    apply_request = _build_apply_request(argv, inputs)
+    if apply_request is not None:
+        logger.info("Invoking kubectl apply")
+        submissions.append(asyncio.to_thread(on_apply, *apply_request))
+
+    results = await asyncio.gather(*submissions)
+
+    for task in (mspl_task, k8s_w_intent_task):
+        if task is not None and not task.done():
+            task.cancel()
+
+    result = next((result for result in results if result != 0), 0)
+
+    if on_prune is not None:
+        if result != 0:
+            logger.info("Skipping pruning because of previous errors")
+            return result
+
+        # stale resources of each input set, including those of manifests removed from the set
+        selectors = [f"{SOURCE_SET_LABEL}={labels[SOURCE_SET_LABEL]},{SOURCE_REVISION_LABEL}!={labels[SOURCE_REVISION_LABEL]}" for labels in set_labels.values()]
+        logger.info(f"Pruning resources from {len(selectors)} source(s)")
+        results = await asyncio.gather(*[asyncio.to_thread(on_prune, selector) for selector in selectors])
+
+    return next((result for result in results if result != 0), 0)
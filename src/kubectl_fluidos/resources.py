@@ -0,0 +1,279 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+from collections.abc import Callable
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import TextIO
+
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+from kubernetes.config import ConfigException
+
+from kubectl_fluidos.common import k8sArgParser
+from kubectl_fluidos.common import load_k8s_configuration
+from kubectl_fluidos.common import manifest_files
+from kubectl_fluidos.common import SOURCE_LABEL
+from kubectl_fluidos.common import source_label_value
+from kubectl_fluidos.common import SOURCE_SET_LABEL
+from kubectl_fluidos.modelbased import FLUIDOS_DEPLOYMENT_GROUP
+from kubectl_fluidos.modelbased import FLUIDOS_DEPLOYMENT_PLURAL
+from kubectl_fluidos.modelbased import FLUIDOS_DEPLOYMENT_VERSION
+
+
+logger = logging.getLogger(__name__)
+
+
+def getArgParser() -> ArgumentParser:
+    parser = ArgumentParser(prog="kubectl fluidos get")
+
+    parser.add_argument("-A", "--all-namespaces", action="store_true")
+    parser.add_argument("-l", "--selector", required=False, type=str)
+    parser.add_argument("--field-selector", required=False, type=str)
+    parser.add_argument("-o", "--output", required=False, choices=["table", "jsonl"], default="table")
+    parser.add_argument("--chunk-size", required=False, type=int, default=500)
+
+    return parser
+
+
+def deleteArgParser() -> ArgumentParser:
+    parser = ArgumentParser(prog="kubectl fluidos delete")
+
+    parser.add_argument("-A", "--all-namespaces", action="store_true")
+    parser.add_argument("-l", "--selector", required=False, type=str)
+    parser.add_argument("-f", "--filename", required=False, action="append", default=[])
+    parser.add_argument("-R", "--recursive", action="store_true")
+
+    return parser
+
+
+def list_fluidos_deployments(api: client.CustomObjectsApi, namespace: str | None, *, label_selector: str | None = None, field_selector: str | None = None, chunk_size: int = 500) -> Iterator[list[dict[str, Any]]]:
+    """
+    Yields the FLUIDOSDeployment resources one page at a time, fetching the next page
+    only once the previous one has been consumed. A `None` namespace lists all namespaces.
+    """
+    arguments: dict[str, Any] = {"limit": chunk_size}
+
+    if label_selector:
+        arguments["label_selector"] = label_selector
+    if field_selector:
+        arguments["field_selector"] = field_selector
+
+    while True:
+        if namespace is None:
+            page = api.list_cluster_custom_object(FLUIDOS_DEPLOYMENT_GROUP, FLUIDOS_DEPLOYMENT_VERSION, FLUIDOS_DEPLOYMENT_PLURAL, **arguments)
+        else:
+            page = api.list_namespaced_custom_object(FLUIDOS_DEPLOYMENT_GROUP, FLUIDOS_DEPLOYMENT_VERSION, namespace, FLUIDOS_DEPLOYMENT_PLURAL, **arguments)
+
+        yield page.get("items", [])
+
+        continue_token = page.get("metadata", {}).get("continue")
+        if not continue_token:
+            return
+        arguments["_continue"] = continue_token
+
+
+def delete_fluidos_deployments(api: client.CustomObjectsApi, namespace: str | None, label_selector: str) -> list[str]:
+    """
+    Deletes the FLUIDOSDeployment resources matching the selector with a single request
+    per namespace. A `None` namespace targets all the namespaces containing matching
+    resources. Returns the namespaces where the deletion has been requested.
+    """
+    if namespace is not None:
+        namespaces = [namespace]
+    else:
+        # collections of namespaced resources can only be deleted per namespace
+        namespaces = sorted({
+            item["metadata"]["namespace"] for page in list_fluidos_deployments(api, None, label_selector=label_selector) for item in page
+        })
+
+    for current_namespace in namespaces:
+        logger.info(f"Deleting FLUIDOSDeployment resources in {current_namespace} matching {label_selector}")
+        api.delete_collection_namespaced_custom_object(
+            FLUIDOS_DEPLOYMENT_GROUP, FLUIDOS_DEPLOYMENT_VERSION, current_namespace, FLUIDOS_DEPLOYMENT_PLURAL, label_selector=label_selector
+        )
+
+    return namespaces
+
+
+def _build_custom_objects_api(args: list[str]) -> client.CustomObjectsApi:
+    # nothing is written to stdout, it might be carrying the requested output
+    k8s_args, remaining_args = k8sArgParser().parse_known_args(args)
+    return client.CustomObjectsApi(client.ApiClient(load_k8s_configuration(k8s_args)))
+
+
+def build_pruner(args: list[str], *, custom_objects_api: client.CustomObjectsApi | None = None) -> Callable[[str], int]:
+    k8s_args, remaining_args = k8sArgParser().parse_known_args(args)
+
+    try:
+        api = custom_objects_api if custom_objects_api is not None else _build_custom_objects_api(args)
+    except ConfigException as e:
+        logger.error(f"Unable to prune FLUIDOSDeployment resources: {e}")
+        return lambda label_selector: 1
+
+    def prune(label_selector: str) -> int:
+        try:
+            delete_fluidos_deployments(api, k8s_args.namespace, label_selector)
+        except ApiException as e:
+            logger.error(f"Unable to prune FLUIDOSDeployment resources ({e.status} {e.reason})")
+            return 1
+        return 0
+
+    return prune
+
+
+def _age(creation_timestamp: str | None, now: datetime) -> str:
+    if not creation_timestamp:
+        return "<unknown>"
+
+    seconds = int((now - datetime.strptime(creation_timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)).total_seconds())
+
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 120 * 60:
+        return f"{seconds // 60}m"
+    if seconds < 48 * 3600:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 86400}d"
+
+
+def _write_table(pages: Iterator[list[dict[str, Any]]], output: TextIO, all_namespaces: bool) -> int:
+    # column widths cannot depend on objects not yet received, hence they are fixed
+    row_format = ("{namespace:<24} " if all_namespaces else "") + "{name:<48} {kind:<16} {age}\n"
+    count = 0
+
+    for page in pages:
+        if not count and len(page):
+            output.write(row_format.format(namespace="NAMESPACE", name="NAME", kind="KIND", age="AGE"))
+
+        now = datetime.now(timezone.utc)
+        for item in page:
+            metadata = item.get("metadata", {})
+            output.write(row_format.format(
+                namespace=metadata.get("namespace", ""),
+                name=metadata.get("name", ""),
+                kind=item.get("spec", {}).get("kind", ""),
+                age=_age(metadata.get("creationTimestamp"), now)
+            ))
+        output.flush()
+        count += len(page)
+
+    return count
+
+
+def _write_json_lines(pages: Iterator[list[dict[str, Any]]], output: TextIO) -> int:
+    count = 0
+
+    for page in pages:
+        for item in page:
+            output.write(json.dumps(item, separators=(",", ":")))
+            output.write("\n")
+        output.flush()
+        count += len(page)
+
+    return count
+
+
+def fluidos_get(args: list[str], output: TextIO, *, custom_objects_api: client.CustomObjectsApi | None = None) -> int:
+    get_args, remaining_args = getArgParser().parse_known_args(args)
+    k8s_args, remaining_args = k8sArgParser().parse_known_args(remaining_args)
+
+    if custom_objects_api is None:
+        try:
+            custom_objects_api = _build_custom_objects_api(args)
+        except ConfigException as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+
+    namespace = None if get_args.all_namespaces else k8s_args.namespace
+
+    pages = list_fluidos_deployments(
+        custom_objects_api,
+        namespace,
+        label_selector=get_args.selector,
+        field_selector=get_args.field_selector,
+        chunk_size=get_args.chunk_size
+    )
+
+    try:
+        if get_args.output == "jsonl":
+            count = _write_json_lines(pages, output)
+        else:
+            count = _write_table(pages, output, get_args.all_namespaces)
+    except ApiException as e:
+        print(f"error: unable to list FLUIDOSDeployment resources ({e.status} {e.reason})", file=sys.stderr)
+        return 1
+
+    if not count and get_args.output == "table":
+        print("No resources found" + (f" in {namespace} namespace." if namespace else "."), file=sys.stderr)
+
+    return 0
+
+
+def fluidos_delete(args: list[str], output: TextIO, *, custom_objects_api: client.CustomObjectsApi | None = None) -> int:
+    delete_args, remaining_args = deleteArgParser().parse_known_args(args)
+    k8s_args, remaining_args = k8sArgParser().parse_known_args(remaining_args)
+
+    # files no longer existing are still identified by their path, directories by their manifests
+    # and by the input set label, covering the manifests removed since they have been applied
+    directories = [argument for argument in delete_args.filename if os.path.isdir(argument)]
+    filenames = [
+        filename for argument in delete_args.filename for filename in (manifest_files(argument, delete_args.recursive) if os.path.isdir(argument) else [argument])
+    ]
+
+    # label selectors cannot express alternatives, each of them is a separate request
+    selectors: list[str] = []
+
+    if len(filenames):
+        selectors.append(f"{SOURCE_LABEL} in ({','.join(source_label_value(filename) for filename in filenames)})")
+    if len(directories):
+        selectors.append(f"{SOURCE_SET_LABEL} in ({','.join(source_label_value(directory) for directory in directories)})")
+    if delete_args.selector:
+        selectors = [f"{selector},{delete_args.selector}" for selector in selectors] if len(selectors) else [delete_args.selector]
+
+    if not len(selectors):
+        print("error: must specify one of -f and -l", file=sys.stderr)
+        return 1
+
+    if custom_objects_api is None:
+        try:
+            custom_objects_api = _build_custom_objects_api(args)
+        except ConfigException as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+
+    namespaces: set[str] = set()
+
+    try:
+        for selector in selectors:
+            namespaces.update(delete_fluidos_deployments(custom_objects_api, None if delete_args.all_namespaces else k8s_args.namespace, selector))
+    except ApiException as e:
+        print(f"error: unable to delete FLUIDOSDeployment resources ({e.status} {e.reason})", file=sys.stderr)
+        return 1
+
+    for namespace in sorted(namespaces):
+        output.write(f"fluidosdeployments.fluidos.eu matching the selector deleted in {namespace} namespace\n")
+
+    return 0
@@ -0,0 +1,130 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import gc
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pkg_resources
+import pytest
+from kubernetes.client import Configuration
+from pytest_httpserver import HTTPServer
+from requests import Session
+
+from kubectl_fluidos import FLUIDOSClient
+from kubectl_fluidos import MSPLProcessorConfiguration
+from kubectl_fluidos.modelbased import ModelBasedOrchestratorConfiguration
+
+
+KUBECONFIG = """apiVersion: v1
+kind: Config
+clusters:
+- cluster:
+    server: https://fluidos.example.com:6443
+  name: test
+contexts:
+- context:
+    cluster: test
+    user: test
+  name: test
+current-context: test
+users:
+- name: test
+  user:
+    token: not-a-real-token
+"""
+
+
+def test_build_configuration_does_not_modify_defaults(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    kubeconfig = tmp_path / "kubeconfig"
+    kubeconfig.write_text(KUBECONFIG)
+
+    default_host = Configuration.get_default_copy().host
+
+    mspl_configuration = MSPLProcessorConfiguration.build_configuration(["--kubeconfig", str(kubeconfig)])
+    model_based_configuration = ModelBasedOrchestratorConfiguration.build_configuration(["--kubeconfig", str(kubeconfig)])
+
+    assert mspl_configuration.hostname == "fluidos.example.com"
+    assert model_based_configuration.configuration is not None
+    assert model_based_configuration.configuration.host == "https://fluidos.example.com:6443"
+    assert Configuration.get_default_copy().host == default_host
+
+
+def test_client_concurrent_requests(httpserver: HTTPServer) -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml")
+
+    httpserver.expect_request("/meservice", method="POST").respond_with_json({"message": "ok"})
+
+    with FLUIDOSClient(mspl=MSPLProcessorConfiguration(url=httpserver.url_for("/meservice"))) as fluidos:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: fluidos(["kubectl-fluidos", "-f", doc_file]), range(16)))
+
+    assert results == [0] * 16
+    assert len(httpserver.log) == 16
+
+
+def test_client_without_backend_reports_error() -> None:
+    intent_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+
+    def apply(a: Any, b: Any) -> int:
+        return 123456
+
+    with FLUIDOSClient(on_apply=apply) as fluidos:
+        assert fluidos(["kubectl-fluidos", "-f", intent_file]) != 0
+        assert fluidos(["kubectl-fluidos", "-f", plain_file]) == 123456
+
+
+def test_client_routes_like_the_cli() -> None:
+    intent_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: Any) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    with FLUIDOSClient(on_apply=apply) as fluidos:
+        # intents received from stdin are not lost, nor applied as plain manifests
+        assert fluidos(["kubectl-fluidos"], StringIO(Path(intent_file).read_text())) != 0
+        assert applied == []
+
+        assert fluidos(["kubectl-fluidos"], StringIO(Path(plain_file).read_text())) == 0
+        assert applied == [(["-f", "-"], Path(plain_file).read_bytes())]
+
+        # every file is considered, not only single file invocations
+        applied.clear()
+        assert fluidos(["kubectl-fluidos", "-f", plain_file, "-f", intent_file]) != 0
+        assert applied == [(["-f", plain_file], None)]
+
+
+def test_client_does_not_retain_sessions(httpserver: HTTPServer) -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml")
+
+    httpserver.expect_request("/meservice", method="POST").respond_with_json({"message": "ok"})
+
+    with FLUIDOSClient(mspl=MSPLProcessorConfiguration(url=httpserver.url_for("/meservice"))) as fluidos:
+        for _ in range(20):
+            assert fluidos(["kubectl-fluidos", "-f", doc_file]) == 0
+
+        gc.collect()
+
+        # each call runs on new executor threads, their sessions go away with them
+        assert sum(1 for instance in gc.get_objects() if isinstance(instance, Session)) <= 2
@@ -0,0 +1,146 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import asyncio
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pkg_resources
+import yaml
+
+from kubectl_fluidos import fluidos_kubectl_extension_async
+from kubectl_fluidos.intents import ANY
+from kubectl_fluidos.intents import has_intents
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.intents import match_intents
+from kubectl_fluidos.intents import parse_quantity
+from kubectl_fluidos.intents import RoutingRule
+from kubectl_fluidos.intents import RoutingTable
+from kubectl_fluidos.modelbased import _request_to_dictionary
+from kubectl_fluidos.modelbased import INTENTS_ANNOTATION
+
+
+def _cron_job(annotations: dict[str, str]) -> dict[str, Any]:
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "CronJob",
+        "metadata": {"name": "report"},
+        "spec": {
+            "schedule": "0 * * * *",
+            "jobTemplate": {"spec": {"template": {"metadata": {"annotations": annotations}, "spec": {"containers": []}}}}
+        }
+    }
+
+
+def test_quantities_are_parsed() -> None:
+    assert parse_quantity("100ms") == (100, "ms")
+    assert parse_quantity("100ops") == (100, "ops")
+    assert parse_quantity(" 1.5 GB") == (1.5, "GB")
+    assert parse_quantity("42") == (42, None)
+    assert parse_quantity("Turin") == (None, None)
+    assert parse_quantity("1e3") == (None, None)
+
+
+def test_top_level_intents() -> None:
+    with pkg_resources.resource_stream(__name__, "dataset/test-deployment-single-w-intent.yaml") as input_data:
+        document = yaml.safe_load(input_data)
+
+    assert has_intents(document)
+    assert match_intents(document) == [
+        Intent("location", "Turin", None, None, "metadata.annotations"),
+        Intent("latency", "100ms", 100, "ms", "metadata.annotations")
+    ]
+
+
+def test_pod_template_intents() -> None:
+    with pkg_resources.resource_stream(__name__, "dataset/test-deployment-single.yaml") as input_data:
+        document = yaml.safe_load(input_data)
+
+    assert not has_intents(document)
+
+    document["spec"]["template"]["metadata"]["annotations"]["fluidos-intent-throughput"] = "100ops"
+
+    assert has_intents(document)
+    assert match_intents(document) == [Intent("throughput", "100ops", 100, "ops", "spec.template.metadata.annotations")]
+
+    cron_job = _cron_job({"fluidos-intent-latency": "10ms"})
+
+    assert match_intents(cron_job) == [Intent("latency", "10ms", 10, "ms", "spec.jobTemplate.spec.template.metadata.annotations")]
+
+
+def test_rules_are_keyed_by_kind() -> None:
+    # pod templates of unknown kinds are not inspected
+    document = {"apiVersion": "example.com/v1", "kind": "Workload", "spec": {"template": {"metadata": {"annotations": {"fluidos-intent-latency": "10ms"}}}}}
+
+    assert not has_intents(document)
+
+    table = RoutingTable([
+        RoutingRule(ANY, "Workload", ("spec.template.metadata.annotations",)),
+        RoutingRule("example.com/v1", ANY, ("metadata.labels",))
+    ])
+    document["metadata"] = {"labels": {"fluidos-intent-location": "Turin"}}
+
+    assert table.has_intents(document)
+    assert [intent.key for intent in table.match(document)] == ["fluidos-intent-location", "fluidos-intent-latency"]
+    assert not table.has_intents({"apiVersion": "v1", "kind": "Workload", "metadata": {"labels": {"fluidos-intent-location": "Turin"}}})
+
+
+def test_malformed_documents_have_no_intents() -> None:
+    assert not has_intents({})
+    assert not has_intents({"apiVersion": "apps/v1", "kind": "Deployment", "metadata": None, "spec": {"template": ["unexpected"]}})
+    assert match_intents({"kind": "Pod", "metadata": {"annotations": {1: "one"}}}) == []
+
+
+def test_intents_are_attached_to_the_request() -> None:
+    request = _request_to_dictionary(yaml.safe_dump(_cron_job({"fluidos-intent-latency": "10ms"})))
+
+    assert json.loads(request["metadata"]["annotations"][INTENTS_ANNOTATION]) == [
+        {"name": "latency", "value": "10ms", "magnitude": 10, "unit": "ms", "path": "spec.jobTemplate.spec.template.metadata.annotations"}
+    ]
+
+    # intents matched while routing are used as they are
+    request = _request_to_dictionary(yaml.safe_dump(_cron_job({})), [Intent("location", "Turin", None, None, "metadata.annotations")])
+
+    assert json.loads(request["metadata"]["annotations"][INTENTS_ANNOTATION]) == [
+        {"name": "location", "value": "Turin", "magnitude": None, "unit": None, "path": "metadata.annotations"}
+    ]
+
+    # manifests parsed while routing are wrapped without being parsed again
+    document = _cron_job({"fluidos-intent-latency": "10ms"})
+
+    assert _request_to_dictionary(document)["spec"] is document
+
+    # source labels are set on the FLUIDOSDeployment only
+    request = _request_to_dictionary(document, None, {"fluidos.eu/source": "abc"})
+
+    assert request["metadata"]["labels"]["fluidos.eu/source"] == "abc"
+    assert "labels" not in document["metadata"]
+
+
+def test_pod_template_intents_are_routed(tmp_path: Path) -> None:
+    doc_file = tmp_path / "cronjob.yaml"
+    doc_file.write_text(yaml.safe_dump(_cron_job({"fluidos-intent-latency": "10ms"})))
+
+    submitted: list[tuple[str, list[Intent]]] = []
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append((data["metadata"]["name"], intents))
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(doc_file)], StringIO(), on_apply=lambda args, stdin: 1, k8s_w_intent_processor=lambda: processor)) == 0
+    assert submitted == [("report", [Intent("latency", "10ms", 10, "ms", "spec.jobTemplate.spec.template.metadata.annotations")])]
@@ -15,13 +15,26 @@ limitations under the License.
 ------------------------------------------------------------------------------
 '''
 import codecs
+import os
+import subprocess
+import sys
+import threading
 from io import StringIO
+from pathlib import Path
 from typing import Any
 
 import pkg_resources
+import pytest
 
+from kubectl_fluidos import _can_passthrough
+from kubectl_fluidos import _default_apply
+from kubectl_fluidos import _has_fluidos_markers
 from kubectl_fluidos import _is_XML
 from kubectl_fluidos import _is_YAML
+from kubectl_fluidos import _looks_like_XML
+from kubectl_fluidos import _map_file_argument_content
+from kubectl_fluidos import _normalize_arguments
+from kubectl_fluidos import _strip_plugin_options
 from kubectl_fluidos import fluidos_kubectl_extension
 
 
@@ -149,3 +162,105 @@ def test_xml_invokes_mspl_by_default() -> None:
     return_value = fluidos_kubectl_extension(["kubectl-fluidos", "-f", doc_file], StringIO(), on_apply=apply, on_k8s_w_intent=drl, on_mlps=mspl)
 
     assert return_value == 000000
+
+
+def test_fluidos_markers_detection() -> None:
+    assert _has_fluidos_markers(b"<?xml version=\"1.0\"?><data/>")
+    assert _has_fluidos_markers(b"\xef\xbb\xbf\n  <data/>")
+    assert _has_fluidos_markers(b"metadata:\n  annotations:\n    fluidos-intent-location: Turin\n")
+    assert not _has_fluidos_markers(b"apiVersion: v1\nkind: Pod\n")
+    assert not _has_fluidos_markers(b"")
+
+
+def test_passthrough_only_for_plain_manifests() -> None:
+    plain = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+    intent = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")
+    mspl = pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml")
+
+    assert _can_passthrough(["-f", plain])
+    assert _can_passthrough(["-f", plain, "--filename", plain])
+    assert not _can_passthrough(["-f", plain, "--fluidos-prune"])
+    assert not _can_passthrough(["-f", plain, "-k", "overlay"])
+    assert not _can_passthrough(["-f", plain, "-f", intent])
+    assert not _can_passthrough(["-f", intent])
+    assert not _can_passthrough(["-f", mspl])
+    assert not _can_passthrough(["-f", "-"])
+    assert not _can_passthrough(["-f"])
+    assert not _can_passthrough([])
+
+
+def test_xml_sniffing_on_mapped_files(tmp_path: Path) -> None:
+    mspl = _map_file_argument_content(pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml"))
+    yaml = _map_file_argument_content(pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml"))
+
+    assert _looks_like_XML(mspl)
+    assert not _looks_like_XML(yaml)
+    assert not _looks_like_XML(b"<<< not xml")
+
+    empty = tmp_path / "empty.yaml"
+    empty.write_bytes(b"")
+
+    assert _map_file_argument_content(str(empty)) == b""
+
+
+def test_fifo_inputs_are_read(tmp_path: Path) -> None:
+    fifo = tmp_path / "manifest.yaml"
+    os.mkfifo(fifo)
+    content = pkg_resources.resource_string(__name__, "dataset/test-deployment-single-w-intent.yaml")
+
+    # non-regular files are never opened by the fast path, their content would be lost
+    assert not _can_passthrough(["-f", str(fifo)])
+
+    def write() -> None:
+        with open(fifo, "wb") as output_file:
+            output_file.write(content)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert _map_file_argument_content(str(fifo)) == content
+    finally:
+        writer.join()
+
+
+def test_passthrough_imports_no_parser() -> None:
+    # the passthrough path must not pay for modules used only by the full pipeline
+    script = "import sys, kubectl_fluidos; print(sorted(name for name in ('yaml', 'xml.etree.ElementTree', 'kubernetes') if name in sys.modules))"
+
+    assert subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout.strip() == "[]"
+
+
+def test_plugin_options_are_not_forwarded() -> None:
+    assert _strip_plugin_options([
+        "-f", "plain.yaml", "--mspl-discovery-ttl", "60", "--mspl-selector=app=mspl", "--fluidos-prune", "--mspl-url", "http://localhost/meservice", "-n", "foo"
+    ]) == ["-f", "plain.yaml", "-n", "foo"]
+
+
+def test_attached_input_options() -> None:
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+    intent_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")
+    mspl_file = pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml")
+
+    assert _normalize_arguments(["--filename=a.yaml", "-fb.yaml", "-f=c.yaml", "--kustomize=overlay", "-koverlay", "-n", "foo"]) == [
+        "--filename", "a.yaml", "-f", "b.yaml", "-f", "c.yaml", "--kustomize", "overlay", "-k", "overlay", "-n", "foo"
+    ]
+
+    assert _can_passthrough(["--filename=" + plain_file])
+    assert not _can_passthrough(["-f", plain_file, "--filename=" + intent_file])
+    assert not _can_passthrough(["-f" + mspl_file])
+    assert not _can_passthrough(["-f", plain_file, "--kustomize=overlay"])
+    assert not _can_passthrough(["-Rf", plain_file])
+
+
+def test_default_apply_uses_no_shell(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    invocations = tmp_path / "invocations"
+    kubectl = tmp_path / "kubectl"
+    kubectl.write_text(f"#!/bin/sh\nprintf '%s\\n' \"$@\" > {invocations}\ncat >> {invocations}\nexit 3\n")
+    kubectl.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+    assert _default_apply(["-f", "b;echo INJECTED;.yaml"], None) == 3
+    assert invocations.read_text().splitlines() == ["apply", "-f", "b;echo INJECTED;.yaml"]
+
+    assert _default_apply(["-f", "-"], "kind: Pod\n") == 3
+    assert invocations.read_text().splitlines() == ["apply", "-f", "-", "kind: Pod"]
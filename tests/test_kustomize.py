@@ -0,0 +1,144 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import asyncio
+import os
+import stat
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pkg_resources
+import pytest
+import yaml
+
+from kubectl_fluidos import fluidos_kubectl_extension_async
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.kustomize import kustomization_digest
+from kubectl_fluidos.kustomize import render_kustomization
+
+
+@pytest.fixture
+def kustomize(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Fake kustomize binary, printing the manifests of the rendered directory and
+    recording each invocation.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+
+    invocations = tmp_path / "invocations"
+    invocations.write_text("")
+
+    binary = bin_dir / "kustomize"
+    binary.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$@\" >> {invocations}\n"
+        "for f in \"$2\"/*.yaml; do [ \"$(basename $f)\" = kustomization.yaml ] || { echo ---; cat \"$f\"; }; done\n"
+    )
+    binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ.get("PATH", ""))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    return invocations
+
+
+def _overlay(tmp_path: Path) -> Path:
+    base = tmp_path / "base"
+    base.mkdir()
+    (base / "kustomization.yaml").write_text("resources:\n- deployment.yaml\n")
+    (base / "deployment.yaml").write_text(Path(pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")).read_text())
+
+    overlay = tmp_path / "overlay"
+    overlay.mkdir()
+    (overlay / "kustomization.yaml").write_text("resources:\n- ../base\n")
+    (overlay / "configmap.yaml").write_text("---\napiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: plain\n")
+
+    return overlay
+
+
+def test_digest_follows_local_references(tmp_path: Path) -> None:
+    overlay = _overlay(tmp_path)
+    renderer = [pkg_resources.resource_filename(__name__, "dataset/test-pod.yaml"), "build"]
+
+    digest = kustomization_digest(str(overlay), renderer)
+    assert digest is not None
+    assert digest == kustomization_digest(str(overlay), renderer)
+
+    (tmp_path / "base" / "deployment.yaml").write_text("kind: Deployment\n")
+    assert digest != kustomization_digest(str(overlay), renderer)
+
+    (overlay / "kustomization.yaml").write_text("resources:\n- https://github.com/fluidos-project/example\n")
+    assert kustomization_digest(str(overlay), renderer) is None
+
+    for reference in ("git::https://example.com/org/repo.git", "bitbucket.org/org/repo", "example.com/org/repo//path?ref=main"):
+        (overlay / "kustomization.yaml").write_text(f"resources:\n- ../base\ncomponents:\n- {reference}\n")
+        assert kustomization_digest(str(overlay), renderer) is None
+
+    (overlay / "kustomization.yaml").write_text("resources: [../base\n")
+    assert kustomization_digest(str(overlay), renderer) is None
+
+
+def test_rendering_is_cached(tmp_path: Path, kustomize: Path) -> None:
+    overlay = _overlay(tmp_path)
+
+    first = render_kustomization(str(overlay))
+    second = render_kustomization(str(overlay))
+
+    assert first == second
+    assert b"name: plain" in first
+    assert len(kustomize.read_text().splitlines()) == 1
+
+    (overlay / "configmap.yaml").write_text("---\napiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: changed\n")
+
+    assert b"name: changed" in render_kustomization(str(overlay))
+    assert len(kustomize.read_text().splitlines()) == 2
+
+
+def test_malformed_kustomization_is_not_cached(tmp_path: Path, kustomize: Path) -> None:
+    overlay = _overlay(tmp_path)
+    (overlay / "kustomization.yaml").write_text("resources: [../base\n")
+
+    render_kustomization(str(overlay))
+    render_kustomization(str(overlay))
+
+    assert len(kustomize.read_text().splitlines()) == 2
+
+
+def test_kustomization_routed_by_pipeline(tmp_path: Path, kustomize: Path) -> None:
+    overlay = tmp_path / "single"
+    overlay.mkdir()
+    (overlay / "kustomization.yaml").write_text("resources:\n- deployment.yaml\n- configmap.yaml\n")
+    (overlay / "deployment.yaml").write_text(Path(pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")).read_text())
+    (overlay / "configmap.yaml").write_text("---\napiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: plain\n")
+
+    submitted: list[Any] = []
+    applied: list[Any] = []
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data["metadata"]["name"])
+        return 0
+
+    def apply(args: list[str], stdin: Any) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-k", str(overlay)], StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+
+    assert submitted == ["dataset-operator"]
+    assert applied[0][0] == ["-f", "-"]
+    assert [document["metadata"]["name"] for document in yaml.safe_load_all(applied[0][1])] == ["plain"]
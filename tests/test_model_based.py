@@ -15,11 +15,14 @@ limitations under the License.
 ------------------------------------------------------------------------------
 '''
 from io import StringIO
+from typing import Any
 
 import pkg_resources
+from kubernetes.client.exceptions import ApiException
 from pytest_kubernetes.providers.base import AClusterManager
 
 from kubectl_fluidos import fluidos_kubectl_extension
+from kubectl_fluidos.modelbased import _request_to_dictionary
 from kubectl_fluidos.modelbased import ModelBasedOrchestratorConfiguration
 from kubectl_fluidos.modelbased import ModelBasedOrchestratorProcessor
 
@@ -77,3 +80,46 @@ def test_error_if_malformed_request(k8s: AClusterManager) -> None:
     assert ret != 0
 
     k8s.delete()
+
+
+def test_request_labels_are_propagated() -> None:
+    with pkg_resources.resource_stream(__name__, "dataset/test-deployment-single-w-intent.yaml") as input_data:
+        request = _request_to_dictionary(input_data.read())
+
+    assert request["metadata"]["name"] == "dataset-operator"
+    assert request["metadata"]["labels"] == {
+        "app.kubernetes.io/name": "dlf",
+        "app.kubernetes.io/managed-by": "kubectl-fluidos"
+    }
+
+
+class _ExistingCustomObjectsApi:
+    def __init__(self) -> None:
+        self.replaced: list[dict[str, Any]] = []
+
+    def create_namespaced_custom_object(self, **kwargs: Any) -> Any:
+        raise ApiException(status=409, reason="Conflict")
+
+    def get_namespaced_custom_object(self, **kwargs: Any) -> dict[str, Any]:
+        return {"metadata": {"name": kwargs["name"], "resourceVersion": "42", "finalizers": ["fluidos.eu/cleanup"]}, "spec": {"stale": True}}
+
+    def replace_namespaced_custom_object(self, **kwargs: Any) -> dict[str, Any]:
+        self.replaced.append(kwargs["body"])
+        return kwargs["body"]
+
+
+def test_existing_resource_is_replaced() -> None:
+    api = _ExistingCustomObjectsApi()
+    processor = ModelBasedOrchestratorProcessor()
+    processor._custom_objects_api = api  # type: ignore
+
+    with pkg_resources.resource_stream(__name__, "dataset/test-deployment-single-w-intent.yaml") as input_data:
+        data = input_data.read()
+
+    assert processor(data) == 0
+
+    assert api.replaced == [{
+        **_request_to_dictionary(data),
+        "metadata": {**_request_to_dictionary(data)["metadata"], "resourceVersion": "42", "finalizers": ["fluidos.eu/cleanup"]}
+    }]
+    assert "stale" not in api.replaced[0]["spec"]
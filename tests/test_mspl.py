@@ -14,18 +14,27 @@ See the License for the specific language governing permissions and
 limitations under the License.
 ------------------------------------------------------------------------------
 '''
+import os
+from dataclasses import replace
 from http import HTTPStatus
 from io import StringIO
+from pathlib import Path
 from typing import Any
 
 import pkg_resources
+import pytest
 import requests
+import yaml
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
 from pytest_httpserver import HTTPServer
 from werkzeug import Response
 
 from kubectl_fluidos import fluidos_kubectl_extension
 from kubectl_fluidos import MSPLProcessor
 from kubectl_fluidos import MSPLProcessorConfiguration
+from kubectl_fluidos.mspl import discover_mspl_url
+from kubectl_fluidos.mspl import MSPL_SERVICE_SELECTOR
 
 
 def test_handler_responses(httpserver: HTTPServer) -> None:
@@ -132,3 +141,94 @@ def test_error_handling_valid_but_incorrect_url() -> None:
     e = mspl_processor(data)
 
     assert e != 0
+
+
+def _service(name: str, service_type: str = "ClusterIP", annotations: dict[str, str] | None = None, ports: list[client.V1ServicePort] | None = None, ingress: list[client.V1LoadBalancerIngress] | None = None) -> client.V1Service:
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(name=name, namespace="fluidos", annotations=annotations),
+        spec=client.V1ServiceSpec(type=service_type, ports=ports if ports is not None else [client.V1ServicePort(name="http", port=8002, node_port=30002)]),
+        status=client.V1ServiceStatus(load_balancer=client.V1LoadBalancerStatus(ingress=ingress))
+    )
+
+
+class _FakeCoreV1Api:
+    def __init__(self, services: list[client.V1Service], cluster_wide: bool = True):
+        self.services = services
+        self.cluster_wide = cluster_wide
+        self.calls: list[tuple[str | None, str]] = []
+
+    def list_service_for_all_namespaces(self, label_selector: str, **kwargs: Any) -> client.V1ServiceList:
+        self.calls.append((None, label_selector))
+        if not self.cluster_wide:
+            raise ApiException(status=403, reason="Forbidden")
+        return client.V1ServiceList(items=self.services)
+
+    def list_namespaced_service(self, namespace: str, label_selector: str, **kwargs: Any) -> client.V1ServiceList:
+        self.calls.append((namespace, label_selector))
+        return client.V1ServiceList(items=self.services)
+
+
+def test_service_discovery() -> None:
+    def discover(service: client.V1Service) -> str | None:
+        return discover_mspl_url(_FakeCoreV1Api([service]), "10.0.0.1", MSPL_SERVICE_SELECTOR, "default")  # type: ignore
+
+    assert discover(_service("mspl")) is None
+    assert discover(_service("mspl", "NodePort")) == "http://10.0.0.1:30002/meservice"
+    assert discover(_service("mspl", "LoadBalancer", ingress=[client.V1LoadBalancerIngress(ip="192.168.1.10")])) == "http://192.168.1.10:8002/meservice"
+    assert discover(_service("mspl", annotations={"fluidos.eu/mspl-url": "https://mspl.example.com/api"})) == "https://mspl.example.com/api"
+    assert discover(_service("mspl", "NodePort", annotations={"fluidos.eu/mspl-port": "https", "fluidos.eu/mspl-path": "/orchestrate"}, ports=[
+        client.V1ServicePort(name="metrics", port=9090, node_port=30090),
+        client.V1ServicePort(name="https", port=8443, node_port=30443)
+    ])) == "https://10.0.0.1:30443/orchestrate"
+    assert discover(_service("mspl", ports=[])) is None
+
+    api = _FakeCoreV1Api([], cluster_wide=False)
+
+    assert discover_mspl_url(api, "10.0.0.1", MSPL_SERVICE_SELECTOR, "foo") is None  # type: ignore
+    assert api.calls == [(None, MSPL_SERVICE_SELECTOR), ("foo", MSPL_SERVICE_SELECTOR)]
+
+
+def test_discovered_url_is_cached(httpserver: HTTPServer, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    kubeconfig = tmp_path / "kubeconfig"
+    kubeconfig.write_text(yaml.safe_dump({
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "test", "cluster": {"server": httpserver.url_for("")}}],
+        "users": [{"name": "test", "user": {"token": "token"}}],
+        "contexts": [{"name": "test", "context": {"cluster": "test", "user": "test"}}, {"name": "other", "context": {"cluster": "test", "user": "test"}}],
+        "current-context": "test"
+    }))
+
+    httpserver.expect_request("/api/v1/services").respond_with_json(client.ApiClient().sanitize_for_serialization(client.V1ServiceList(items=[
+        _service("mspl", annotations={"fluidos.eu/mspl-url": httpserver.url_for("/meservice")})
+    ])))
+    httpserver.expect_request("/meservice", method="POST").respond_with_json({"message": "ok"})
+
+    args = ["kubectl-fluidos", "--kubeconfig", str(kubeconfig)]
+
+    configuration = MSPLProcessorConfiguration.build_configuration(args)
+
+    assert configuration.get_url() == httpserver.url_for("/meservice")
+    assert configuration.discovery_cache is not None and os.path.exists(configuration.discovery_cache)
+    assert httpserver.log[0][0].args["labelSelector"] == MSPL_SERVICE_SELECTOR
+
+    # served from the cache, the API server is not queried again
+    assert MSPLProcessorConfiguration.build_configuration(args) == configuration
+    assert len(httpserver.log) == 1
+
+    # entries are not shared across contexts and namespaces
+    other_context = MSPLProcessorConfiguration.build_configuration(args + ["--context", "other"])
+    other_namespace = MSPLProcessorConfiguration.build_configuration(args + ["-n", "other"])
+
+    assert len({configuration.discovery_cache, other_context.discovery_cache, other_namespace.discovery_cache}) == 3
+    assert MSPLProcessorConfiguration.build_configuration(args + ["--context", "test"]) == configuration
+    httpserver.clear_log()
+
+    assert MSPLProcessor(configuration)("FOOO") == 0
+    assert os.path.exists(configuration.discovery_cache)
+
+    # connection failures invalidate the cached entry
+    assert MSPLProcessor(replace(configuration, url="http://localhost:1/meservice"))("FOOO") != 0
+    assert not os.path.exists(configuration.discovery_cache)
@@ -0,0 +1,112 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import asyncio
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pkg_resources
+import pytest
+
+from kubectl_fluidos import fluidos_kubectl_extension
+from kubectl_fluidos import fluidos_kubectl_extension_async
+from kubectl_fluidos.intents import Intent
+from kubectl_fluidos.parsers import _BACKENDS
+from kubectl_fluidos.parsers import get_backend
+from kubectl_fluidos.parsers import JSON
+from kubectl_fluidos.parsers import load_document
+from kubectl_fluidos.parsers import load_documents
+from kubectl_fluidos.parsers import ParserBackend
+from kubectl_fluidos.parsers import register_backend
+from kubectl_fluidos.parsers import sniff_format
+from kubectl_fluidos.parsers import YAML
+
+
+def test_format_sniffing() -> None:
+    assert sniff_format(b'{"kind": "Pod"}') == JSON
+    assert sniff_format(b"\xef\xbb\xbf\n  [1, 2]") == JSON
+    assert sniff_format(' {"kind": "Pod"}') == JSON
+    assert sniff_format(b"kind: Pod") == YAML
+    assert sniff_format("") == YAML
+
+
+def test_json_documents() -> None:
+    assert load_documents(b'{"kind": "Pod", "metadata": {"name": "foo"}}') == (JSON, [{"kind": "Pod", "metadata": {"name": "foo"}}])
+    assert load_documents(b'{"kind": "Pod"}\n\n{"kind": "Service"}\n') == (JSON, [{"kind": "Pod"}, {"kind": "Service"}])
+    assert load_documents(b'{"kind": "List", "items": [{"kind": "Pod"}, {"kind": "DeploymentList", "items": [{"kind": "Deployment"}]}]}') == (JSON, [{"kind": "Pod"}, {"kind": "Deployment"}])
+
+
+def test_flow_yaml_is_not_json() -> None:
+    assert load_documents(b"{kind: Pod}") == (YAML, [{"kind": "Pod"}])
+    assert load_document(b"{kind: Pod}") == {"kind": "Pod"}
+
+
+def test_yaml_documents() -> None:
+    assert load_documents(b"kind: Pod\n---\n---\nkind: List\nitems:\n- kind: Service\n") == (YAML, [{"kind": "Pod"}, {"kind": "Service"}])
+
+
+def test_backend_priority(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(_BACKENDS, JSON, list(_BACKENDS[JSON]))
+
+    loaded: list[Any] = []
+
+    def load(data: Any) -> Any:
+        loaded.append(data)
+        return json.loads(data)
+
+    register_backend(JSON, ParserBackend("custom", load, lambda data: [load(data)], json.dumps), priority=100)
+
+    assert get_backend(JSON).name == "custom"
+    assert load_document(b'{"kind": "Pod"}') == {"kind": "Pod"}
+    assert loaded == [b'{"kind": "Pod"}']
+
+
+def test_json_manifest_with_intent() -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.json")
+
+    def apply(a: Any, b: Any) -> int:
+        return 123456
+
+    def drl(a: Any) -> int:
+        return 9876342
+
+    assert fluidos_kubectl_extension(["kubectl-fluidos", "-f", doc_file], StringIO(), on_apply=apply, on_k8s_w_intent=drl) == 9876342
+
+
+def test_json_list_routed_by_pipeline(tmp_path: Path) -> None:
+    with open(pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.json")) as input_file:
+        deployment = json.load(input_file)
+
+    doc_file = tmp_path / "list.json"
+    doc_file.write_text(json.dumps({"apiVersion": "v1", "kind": "List", "items": [deployment, {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "plain"}}]}))
+
+    submitted: list[Any] = []
+    applied: list[Any] = []
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data)
+        return 0
+
+    def apply(args: list[str], stdin: Any) -> int:
+        applied.append(stdin)
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(doc_file)], StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+
+    assert [document["metadata"]["name"] for document in submitted] == ["dataset-operator"]
+    assert len(applied) == 1 and "name: plain" in applied[0]
@@ -0,0 +1,363 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import asyncio
+import json
+import os
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pkg_resources
+import yaml
+from pytest_httpserver import HTTPServer
+
+from kubectl_fluidos import fluidos_kubectl_extension_async
+from kubectl_fluidos import MSPLProcessor
+from kubectl_fluidos import MSPLProcessorConfiguration
+from kubectl_fluidos.common import source_label_value
+from kubectl_fluidos.common import source_revision_label_value
+from kubectl_fluidos.intents import Intent
+
+
+def _intent_deployment(name: str) -> dict[str, Any]:
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {
+            "name": name,
+            "annotations": {"fluidos-intent-location": "Turin"}
+        }
+    }
+
+
+def test_plain_manifest_falls_back_to_apply() -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | None) -> int:
+        applied.append((args, stdin))
+        return 123456
+
+    warmed_up: list[Any] = []
+
+    class Processor:
+        def warm_up(self) -> None:
+            warmed_up.append(self)
+
+        def __call__(self, *args: Any) -> int:
+            raise AssertionError("processor not expected")
+
+    built: list[Processor] = []
+
+    def factory() -> Processor:
+        built.append(Processor())
+        return built[-1]
+
+    return_value = asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", doc_file, "--namespace", "foo", "--mspl-discovery-ttl", "60"], StringIO(), on_apply=apply, mspl_processor=factory, k8s_w_intent_processor=factory))
+
+    assert return_value == 123456
+    # configurations are resolved while reading, connections are warmed up only when needed
+    assert len(built) == 2
+    assert warmed_up == []
+    assert applied == [(["-f", doc_file, "--namespace", "foo"], None)]
+
+
+def test_mspl_pipeline(httpserver: HTTPServer) -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-mspl.xml")
+
+    httpserver.expect_request("/meservice", method="HEAD").respond_with_data("")
+    httpserver.expect_request("/meservice", method="POST").respond_with_json({"message": "ok"})
+
+    def apply(a: Any, b: Any) -> int:
+        return 123456
+
+    return_value = asyncio.run(fluidos_kubectl_extension_async(
+        ["kubectl-fluidos", "-f", doc_file],
+        StringIO(),
+        on_apply=apply,
+        mspl_processor=lambda: MSPLProcessor(MSPLProcessorConfiguration(url=httpserver.url_for("/meservice")))
+    ))
+
+    assert return_value == 0
+    assert [request.method for request, _ in httpserver.log] == ["HEAD", "POST"]
+    assert httpserver.log[1][0].get_data() == Path(doc_file).read_bytes()
+
+
+def test_multiple_documents_are_routed_individually(tmp_path: Path) -> None:
+    plain = {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "plain"}}
+    doc_file = tmp_path / "mixed.yaml"
+    doc_file.write_text(yaml.safe_dump_all([_intent_deployment("first"), plain, _intent_deployment("second")]))
+
+    submitted: list[str] = []
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | None) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data["metadata"]["name"])
+        return 0
+
+    return_value = asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(doc_file)], StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor))
+
+    assert return_value == 0
+    assert sorted(submitted) == ["first", "second"]
+    assert len(applied) == 1
+    assert applied[0][0] == ["-f", "-"]
+    assert list(yaml.safe_load_all(applied[0][1])) == [plain]
+
+
+def test_submissions_are_overlapped(tmp_path: Path) -> None:
+    doc_file = tmp_path / "many.yaml"
+    doc_file.write_text(yaml.safe_dump_all([_intent_deployment(f"deployment-{idx}") for idx in range(16)]))
+
+    lock = threading.Lock()
+    in_flight: list[int] = [0, 0]  # current, max
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return 0
+
+    return_value = asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(doc_file)], StringIO(), k8s_w_intent_processor=lambda: processor, max_in_flight=4))
+
+    assert return_value == 0
+    assert 1 < in_flight[1] <= 4
+
+
+def test_missing_processor_is_an_error() -> None:
+    doc_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single-w-intent.yaml")
+
+    def apply(a: Any, b: Any) -> int:
+        return 0
+
+    def factory() -> Any:
+        raise RuntimeError("Unable to build configuration")
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", doc_file], StringIO(), on_apply=apply)) != 0
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", doc_file], StringIO(), on_apply=apply, k8s_w_intent_processor=factory)) != 0
+
+
+def test_no_input_provided() -> None:
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos"], StringIO())) == 1
+
+
+def test_prune_after_successful_submissions(tmp_path: Path) -> None:
+    doc_file = tmp_path / "intents.yaml"
+    doc_file.write_text(yaml.safe_dump(_intent_deployment("first")))
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+
+    submitted: list[tuple[dict[str, Any], dict[str, str]]] = []
+    applied: list[Any] = []
+    pruned: list[str] = []
+
+    def apply(args: list[str], stdin: str | None) -> int:
+        applied.append(args)
+        return 0
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append((data, labels))
+        return 0
+
+    def prune(selector: str) -> int:
+        pruned.append(selector)
+        return 0
+
+    argv = ["kubectl-fluidos", "-f", str(doc_file), "-f", plain_file, "--fluidos-prune"]
+    return_value = asyncio.run(fluidos_kubectl_extension_async(argv, StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor, on_prune=prune))
+
+    assert return_value == 0
+    assert applied == [["-f", plain_file]]
+
+    document, labels = submitted[0]
+    # the manifest is left as provided, labels are only set on the FLUIDOSDeployment
+    assert "labels" not in document["metadata"]
+    assert labels["fluidos.eu/source"] == source_label_value(str(doc_file))
+    assert labels["fluidos.eu/source-set"] == source_label_value(str(doc_file))
+    assert labels["fluidos.eu/source-revision"] == source_revision_label_value(f"{source_label_value(str(doc_file))}:{source_revision_label_value(doc_file.read_text())}")
+    assert sorted(pruned) == sorted([
+        f"fluidos.eu/source-set={labels['fluidos.eu/source-set']},fluidos.eu/source-revision!={labels['fluidos.eu/source-revision']}",
+        f"fluidos.eu/source-set={source_label_value(plain_file)},fluidos.eu/source-revision!={source_revision_label_value('')}"
+    ])
+
+
+def test_prune_removed_manifests(tmp_path: Path) -> None:
+    (tmp_path / "first.yaml").write_text(yaml.safe_dump(_intent_deployment("first")))
+    (tmp_path / "second.yaml").write_text(yaml.safe_dump(_intent_deployment("second")))
+
+    revisions: list[set[str]] = []
+    pruned: list[str] = []
+
+    def run() -> None:
+        submitted: list[dict[str, str]] = []
+
+        def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+            submitted.append(labels)
+            return 0
+
+        def prune(selector: str) -> int:
+            pruned.append(selector)
+            return 0
+
+        argv = ["kubectl-fluidos", "-f", str(tmp_path), "--fluidos-prune"]
+        assert asyncio.run(fluidos_kubectl_extension_async(argv, StringIO(), k8s_w_intent_processor=lambda: processor, on_prune=prune)) == 0
+        assert {labels["fluidos.eu/source-set"] for labels in submitted} == {source_label_value(str(tmp_path))}
+        revisions.append({labels["fluidos.eu/source-revision"] for labels in submitted})
+
+    run()
+    (tmp_path / "second.yaml").unlink()
+    run()
+
+    # the whole directory shares a revision, which changes when a manifest is removed from it
+    assert len(revisions[0]) == len(revisions[1]) == 1
+    assert revisions[0] != revisions[1]
+    assert pruned[-1] == f"fluidos.eu/source-set={source_label_value(str(tmp_path))},fluidos.eu/source-revision!={revisions[1].pop()}"
+
+
+def test_no_prune_after_failures(tmp_path: Path) -> None:
+    doc_file = tmp_path / "intents.yaml"
+    doc_file.write_text(yaml.safe_dump(_intent_deployment("first")))
+
+    pruned: list[str] = []
+
+    def prune(selector: str) -> int:
+        pruned.append(selector)
+        return 0
+
+    return_value = asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(doc_file)], StringIO(), k8s_w_intent_processor=lambda: lambda data, intents, labels: 1, on_prune=prune))
+
+    assert return_value == 1
+    assert not len(pruned)
+
+
+def test_directories_are_expanded(tmp_path: Path) -> None:
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "intents.yaml").write_text(yaml.safe_dump(_intent_deployment("first")))
+    (tmp_path / "plain.yml").write_text(Path(plain_file).read_text())
+    (tmp_path / "README.md").write_text("not a manifest")
+    (tmp_path / "nested" / "intents.json").write_text(json.dumps(_intent_deployment("second")))
+
+    submitted: list[str] = []
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | None) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data["metadata"]["name"])
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(tmp_path)], StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+    assert submitted == ["first"]
+    assert applied == [(["-f", str(tmp_path / "plain.yml")], None)]
+
+    submitted.clear()
+    applied.clear()
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-R", "-f", str(tmp_path)], StringIO(), on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+    assert sorted(submitted) == ["first", "second"]
+    assert applied == [(["-R", "-f", str(tmp_path / "plain.yml")], None)]
+
+
+def test_stdin_as_filename(tmp_path: Path) -> None:
+    plain_file = pkg_resources.resource_filename(__name__, "dataset/test-deployment-single.yaml")
+    plain = {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "plain"}}
+    doc_file = tmp_path / "mixed.yaml"
+    doc_file.write_text(yaml.safe_dump_all([_intent_deployment("first"), plain]))
+
+    submitted: list[str] = []
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | bytes | None) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data["metadata"]["name"])
+        return 0
+
+    stdin = StringIO(yaml.safe_dump(_intent_deployment("from-stdin")))
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", "-"], stdin, on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+    assert submitted == ["from-stdin"]
+    assert applied == []
+
+    # plain stdin is applied once, together with the leftovers of the routed files
+    submitted.clear()
+    stdin = StringIO(Path(plain_file).read_text())
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", "-", "-f", str(doc_file)], stdin, on_apply=apply, k8s_w_intent_processor=lambda: processor)) == 0
+    assert submitted == ["first"]
+    assert applied[0][0] == ["-f", "-"]
+    assert [document["metadata"]["name"] for document in yaml.safe_load_all(applied[0][1])] == ["dataset-operator", "plain"]
+
+
+def test_fifo_content_is_forwarded(tmp_path: Path) -> None:
+    content = pkg_resources.resource_string(__name__, "dataset/test-deployment-single.yaml")
+    fifo = tmp_path / "manifest.yaml"
+    os.mkfifo(fifo)
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | bytes | None) -> int:
+        applied.append((args, stdin))
+        return 0
+
+    def write() -> None:
+        with open(fifo, "wb") as output_file:
+            output_file.write(content)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(fifo)], StringIO(), on_apply=apply)) == 0
+    finally:
+        writer.join()
+
+    # kubectl cannot read the FIFO again, its content is provided via stdin
+    assert applied == [(["-f", "-"], content)]
+
+
+def test_unreadable_input_is_an_error(tmp_path: Path) -> None:
+    applied: list[Any] = []
+
+    def apply(args: list[str], stdin: str | None) -> int:
+        applied.append(args)
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", "-f", str(tmp_path / "missing.yaml")], StringIO(), on_apply=apply)) == 1
+    assert applied == []
+
+
+def test_attached_filename_is_routed(tmp_path: Path) -> None:
+    doc_file = tmp_path / "intents.yaml"
+    doc_file.write_text(yaml.safe_dump(_intent_deployment("first")))
+
+    submitted: list[str] = []
+
+    def processor(data: dict[str, Any], intents: list[Intent], labels: dict[str, str]) -> int:
+        submitted.append(data["metadata"]["name"])
+        return 0
+
+    assert asyncio.run(fluidos_kubectl_extension_async(["kubectl-fluidos", f"--filename={doc_file}"], StringIO(), on_apply=lambda args, stdin: 1, k8s_w_intent_processor=lambda: processor)) == 0
+    assert submitted == ["first"]
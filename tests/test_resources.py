@@ -0,0 +1,182 @@
+'''
+------------------------------------------------------------------------------
+Copyright 2023 IBM Research Europe
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+ http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+------------------------------------------------------------------------------
+'''
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from kubectl_fluidos.common import source_label_value
+from kubectl_fluidos.resources import build_pruner
+from kubectl_fluidos.resources import fluidos_delete
+from kubectl_fluidos.resources import fluidos_get
+from kubectl_fluidos.resources import list_fluidos_deployments
+
+
+def _fluidos_deployment(name: str, namespace: str = "default") -> dict[str, Any]:
+    return {
+        "apiVersion": "fluidos.eu/v1",
+        "kind": "FLUIDOSDeployment",
+        "metadata": {"name": name, "namespace": namespace, "creationTimestamp": "2024-01-01T00:00:00Z"},
+        "spec": {"kind": "Deployment"}
+    }
+
+
+class PaginatedCustomObjectsApi:
+    def __init__(self, items: list[dict[str, Any]]) -> None:
+        self.items = items
+        self.calls: list[dict[str, Any]] = []
+
+    def _page(self, **kwargs: Any) -> dict[str, Any]:
+        self.calls.append(kwargs)
+        start = int(kwargs.get("_continue", 0))
+        end = start + kwargs["limit"]
+        return {
+            "items": self.items[start:end],
+            "metadata": {"continue": str(end) if end < len(self.items) else None}
+        }
+
+    def list_namespaced_custom_object(self, group: str, version: str, namespace: str, plural: str, **kwargs: Any) -> dict[str, Any]:
+        assert (group, version, plural) == ("fluidos.eu", "v1", "fluidosdeployments")
+        return self._page(namespace=namespace, **kwargs)
+
+    def list_cluster_custom_object(self, group: str, version: str, plural: str, **kwargs: Any) -> dict[str, Any]:
+        assert (group, version, plural) == ("fluidos.eu", "v1", "fluidosdeployments")
+        return self._page(**kwargs)
+
+
+def test_pages_are_fetched_lazily() -> None:
+    api = PaginatedCustomObjectsApi([_fluidos_deployment(f"fd-{idx}") for idx in range(5)])
+
+    pages = list_fluidos_deployments(api, "default", label_selector="app=foo", chunk_size=2)  # type: ignore
+
+    assert len(next(pages)) == 2
+    assert len(api.calls) == 1
+    assert api.calls[0] == {"namespace": "default", "limit": 2, "label_selector": "app=foo"}
+
+    assert [len(page) for page in pages] == [2, 1]
+    assert [call.get("_continue") for call in api.calls] == [None, "2", "4"]
+
+
+def test_get_json_lines() -> None:
+    api = PaginatedCustomObjectsApi([_fluidos_deployment(f"fd-{idx}", f"ns-{idx}") for idx in range(3)])
+    output = StringIO()
+
+    assert fluidos_get(["-A", "-o", "jsonl", "--chunk-size", "2", "--field-selector", "metadata.name=fd-1"], output, custom_objects_api=api) == 0  # type: ignore
+
+    assert [json.loads(line)["metadata"]["name"] for line in output.getvalue().splitlines()] == ["fd-0", "fd-1", "fd-2"]
+    assert "namespace" not in api.calls[0]
+    assert api.calls[0]["field_selector"] == "metadata.name=fd-1"
+
+
+def test_get_table() -> None:
+    api = PaginatedCustomObjectsApi([_fluidos_deployment(f"fd-{idx}", "foo") for idx in range(3)])
+    output = StringIO()
+
+    assert fluidos_get(["-n", "foo"], output, custom_objects_api=api) == 0  # type: ignore
+
+    lines = output.getvalue().splitlines()
+    assert lines[0].split() == ["NAME", "KIND", "AGE"]
+    assert [line.split()[:2] for line in lines[1:]] == [["fd-0", "Deployment"], ["fd-1", "Deployment"], ["fd-2", "Deployment"]]
+    assert api.calls[0]["namespace"] == "foo"
+
+
+def test_get_no_resources() -> None:
+    output = StringIO()
+
+    assert fluidos_get([], output, custom_objects_api=PaginatedCustomObjectsApi([])) == 0  # type: ignore
+    assert output.getvalue() == ""
+
+
+class DeletingCustomObjectsApi(PaginatedCustomObjectsApi):
+    def __init__(self, items: list[dict[str, Any]]) -> None:
+        super().__init__(items)
+        self.deletions: list[tuple[str, str]] = []
+
+    def delete_collection_namespaced_custom_object(self, group: str, version: str, namespace: str, plural: str, **kwargs: Any) -> dict[str, Any]:
+        assert (group, version, plural) == ("fluidos.eu", "v1", "fluidosdeployments")
+        self.deletions.append((namespace, kwargs["label_selector"]))
+        return {}
+
+
+def test_delete_by_selector() -> None:
+    api = DeletingCustomObjectsApi([])
+
+    assert fluidos_delete(["-l", "app=foo", "-n", "bar"], StringIO(), custom_objects_api=api) == 0  # type: ignore
+    assert api.deletions == [("bar", "app=foo")]
+    assert not len(api.calls)
+
+
+def test_delete_by_source_manifest_in_all_namespaces() -> None:
+    api = DeletingCustomObjectsApi([_fluidos_deployment("fd-0", "ns-1"), _fluidos_deployment("fd-1", "ns-0"), _fluidos_deployment("fd-2", "ns-1")])
+
+    assert fluidos_delete(["-A", "-f", "first.yaml", "-f", "second.yaml"], StringIO(), custom_objects_api=api) == 0  # type: ignore
+
+    selector = f"fluidos.eu/source in ({source_label_value('first.yaml')},{source_label_value('second.yaml')})"
+    assert api.deletions == [("ns-0", selector), ("ns-1", selector)]
+    assert api.calls[0]["label_selector"] == selector
+
+
+def test_delete_by_source_directory(tmp_path: Path) -> None:
+    api = DeletingCustomObjectsApi([])
+    (tmp_path / "first.yaml").write_text("kind: Pod")
+    (tmp_path / "notes.txt").write_text("not a manifest")
+
+    assert fluidos_delete(["-f", str(tmp_path), "-n", "bar"], StringIO(), custom_objects_api=api) == 0  # type: ignore
+    # manifests removed from the directory are matched by its input set
+    assert api.deletions == [
+        ("bar", f"fluidos.eu/source in ({source_label_value(str(tmp_path / 'first.yaml'))})"),
+        ("bar", f"fluidos.eu/source-set in ({source_label_value(str(tmp_path))})")
+    ]
+
+    api.deletions.clear()
+    (tmp_path / "first.yaml").unlink()
+
+    assert fluidos_delete(["-f", str(tmp_path), "-n", "bar", "-l", "app=foo"], StringIO(), custom_objects_api=api) == 0  # type: ignore
+    assert api.deletions == [("bar", f"fluidos.eu/source-set in ({source_label_value(str(tmp_path))}),app=foo")]
+
+
+def test_delete_requires_selection() -> None:
+    api = DeletingCustomObjectsApi([])
+
+    assert fluidos_delete([], StringIO(), custom_objects_api=api) != 0  # type: ignore
+    assert not len(api.deletions)
+
+
+def test_pruner() -> None:
+    api = DeletingCustomObjectsApi([])
+
+    prune = build_pruner(["--namespace", "foo"], custom_objects_api=api)  # type: ignore
+
+    assert prune("fluidos.eu/source=abc,fluidos.eu/source-revision!=def") == 0
+    assert api.deletions == [("foo", "fluidos.eu/source=abc,fluidos.eu/source-revision!=def")]
+
+
+def test_configuration_errors_are_not_written_to_stdout(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("KUBERNETES_SERVICE_HOST", raising=False)
+
+    output = StringIO()
+
+    assert fluidos_get(["-o", "jsonl"], output) == 1
+    assert fluidos_get(["-o", "jsonl", "--kubeconfig", str(tmp_path / "missing")], output) == 1
+    assert output.getvalue() == ""
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err.startswith("error: ")